@@ -1,22 +1,84 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, StreamingResponse, FileResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import asyncio
 import json
-from typing import Dict, Any
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import List, Optional, Tuple
 import os
+import secrets
 from dotenv import load_dotenv
-from transformers import gpt4o_mini_azure_history
-from azure_tts_helper import azure_tts
+from transformers import (
+    gpt4o_mini_azure_history_async,
+    gpt4o_mini_azure_history_stream,
+    close_async_clients,
+    estimate_tokens,
+)
+from sentence_chunker import SentenceChunker, split_sentences
+from azure_tts_helper import TTSThrottledError, azure_tts
+from scheduler import is_throttle_error, llm_scheduler, tts_scheduler
+from transcript import TRANSCRIPT_SUMMARIZE, Transcript
+from prompts import REPETITION_NUDGE, build_system_prompt, opener_history
+from repetition import REPETITION_DETECTION, RepetitionMonitor, repetition_actions
+from response_cache import response_cache, response_key
+from prewarm import PREWARM_TEMPLATES, prewarm_openers
+from readiness import readiness
+import metrics
+from tracing import TurnTrace, trace_buffer
+from stall_detector import LOOP_STALL_DETECTOR, stall_detector
+from static_assets import IMMUTABLE_CACHE, asset_store
+from audio_store import clip_store
+from audio_export import (
+    EXPORT_GAP_SECONDS,
+    MAX_EXPORT_GAP_SECONDS,
+    Mp3Export,
+    iter_chunks,
+)
+from archive import ARCHIVE_CONVERSATIONS, conversation_archive
+from sessions import Session, SessionLimitError, sessions
 import threading
 import time
 import atexit
 
 load_dotenv()
 
-app = FastAPI()
+
+async def warm_up():
+    """Warm up the Azure clients, then prewarm the sample templates' openers"""
+    await readiness.warm_up()
+    key = os.getenv("AZURE_OPENAI_KEY_DE_4_1")
+    endpoint = os.getenv("AZURE_OPENAI_ENDPOINT_DE_4_1")
+    if PREWARM_TEMPLATES and key and endpoint:
+        await prewarm_openers(key, endpoint)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run background services for the app's lifetime
+
+    Azure clients warm up in the background so the server accepts traffic
+    right away; /ready reports when they are warm.
+    """
+    tasks = [
+        asyncio.create_task(clip_store.run_janitor()),
+        asyncio.create_task(warm_up()),
+    ]
+    if LOOP_STALL_DETECTOR:
+        tasks.append(asyncio.create_task(stall_detector.run()))
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Close pooled Azure OpenAI connections
+        await close_async_clients()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 # Register cleanup function for Azure TTS connection
@@ -31,6 +93,7 @@ def cleanup_azure_connection():
 
 atexit.register(cleanup_azure_connection)
 
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -47,19 +110,89 @@ app.add_middleware(
 )
 
 # Mount static files for audio
-app.mount("/audio", StaticFiles(directory="voices"), name="audio")
-
-# Mount static files for frontend (CSS, JS)
-app.mount("/static", StaticFiles(directory="."), name="static")
-
-# Store active conversations
-active_conversations: Dict[str, Dict[str, Any]] = {}
+app.mount(
+    "/audio",
+    StaticFiles(directory=os.path.join(os.path.dirname(__file__), "voices")),
+    name="audio",
+)
 
-# Store audio finished events
-audio_finished_events: Dict[str, asyncio.Event] = {}
+# Mount the static directory only; the repo root must not be browsable
+app.mount(
+    "/static",
+    StaticFiles(directory=os.path.join(os.path.dirname(__file__), "static")),
+    name="static",
+)
 
-# Store running conversation tasks for proper cleanup
-conversation_tasks: Dict[str, asyncio.Task] = {}
+# How many turns may be generated ahead of the one currently playing.
+# 0 keeps the strictly serial behaviour; clients may request up to MAX_LOOKAHEAD
+DEFAULT_LOOKAHEAD = int(os.getenv("CONVERSATION_LOOKAHEAD", "1"))
+MAX_LOOKAHEAD = 3
+
+# Turns a lookahead (protocol 2) client may hold unplayed in its queue
+DEFAULT_PLAYBACK_BUFFER = int(os.getenv("PLAYBACK_BUFFER_TURNS", "2"))
+MAX_PLAYBACK_BUFFER = 4
+
+# Stream TTS audio to the client while it is still being synthesized
+STREAM_TTS_AUDIO = os.getenv("STREAM_TTS_AUDIO", "1") == "1"
+
+
+def discard_synthesis(clip_id: str, synthesis: asyncio.Future):
+    """Drop the clip of a synthesis that will never be played"""
+    synthesis.add_done_callback(lambda _: clip_store.discard([clip_id]))
+
+
+class Turn:
+    """One entity's reply, consumed by playback while it is still being generated
+
+    The generator adds (text, clip id, synthesis future) segments as soon as
+    their text exists; playback reads them from the queue until the None
+    sentinel. Every synthesis stays on the turn so a stopped conversation
+    can cancel it. The trace records where the turn's time went.
+    """
+
+    def __init__(self, entity_num: int, voice: str, speed: float, trace: TurnTrace):
+        self.entity_num = entity_num
+        self.voice = voice
+        self.speed = speed
+        self.trace = trace
+        self.segments: asyncio.Queue = asyncio.Queue()
+        self.sentences: List[str] = []
+        self.clip_ids: List[str] = []
+        self.syntheses: List[asyncio.Future] = []
+
+    @property
+    def text(self) -> str:
+        return " ".join(self.sentences)
+
+    def add_segment(self, text: str, clip_id: str, synthesis: asyncio.Future):
+        self.sentences.append(text)
+        self.clip_ids.append(clip_id)
+        self.syntheses.append(synthesis)
+        self.segments.put_nowait((text, clip_id, synthesis))
+
+    def finish(self):
+        self.segments.put_nowait(None)
+
+    async def audio(self) -> bytes:
+        """The turn's synthesized audio, as far as it is still stored"""
+        clips = [
+            await clip_store.call(clip_store.get, clip_id) for clip_id in self.clip_ids
+        ]
+        return b"".join(clip.data for clip in clips if clip is not None)
+
+    def discard(self):
+        """Drop all unplayed segments, cancel unfinished syntheses and
+        delete their audio"""
+        while not self.segments.empty():
+            item = self.segments.get_nowait()
+            if item is not None:
+                discard_synthesis(item[1], item[2])
+        # Segments already taken by playback may still be synthesizing;
+        # cancelling also keeps queued jobs from ever reaching Azure
+        for clip_id, synthesis in zip(self.clip_ids, self.syntheses):
+            if not synthesis.done():
+                synthesis.cancel()
+                discard_synthesis(clip_id, synthesis)
 
 
 class ConversationRequest(BaseModel):
@@ -71,17 +204,89 @@ class ConversationRequest(BaseModel):
     speed2: float = 1.0
 
 
+# Pipeline gauges are read when /metrics is scraped
+metrics.registry.gauge(
+    "babel_sessions", "Connected websocket sessions", lambda: len(sessions)
+)
+metrics.registry.gauge(
+    "babel_active_conversations", "Conversations currently running", lambda: sessions.active
+)
+metrics.registry.gauge(
+    "babel_tts_executor_in_flight",
+    "Synthesis jobs submitted to the TTS thread pool and not yet finished",
+    lambda: azure_tts.executor.in_flight,
+)
+metrics.registry.gauge("babel_clip_store_clips", "Clips held by the clip store", lambda: len(clip_store))
+metrics.registry.gauge(
+    "babel_clip_store_bytes", "Audio bytes held by the clip store", lambda: clip_store.total_bytes
+)
+metrics.registry.gauge(
+    "babel_llm_scheduler_waiting", "LLM calls waiting for admission", lambda: llm_scheduler.waiting
+)
+metrics.registry.gauge(
+    "babel_tts_scheduler_waiting", "TTS calls waiting for admission", lambda: tts_scheduler.waiting
+)
+
+
+@app.get("/ready")
+async def get_readiness():
+    """Readiness probe: 503 until the Azure clients are warm"""
+    return JSONResponse(
+        {"ready": readiness.ready, **readiness.status},
+        status_code=200 if readiness.ready else 503,
+    )
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics for this worker"""
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/traces")
+async def get_traces(session: Optional[str] = None, format: str = "json"):
+    """Recent turn traces, as JSON or in the Chrome trace event format"""
+    if format == "chrome":
+        return trace_buffer.to_chrome(session)
+    if format != "json":
+        raise HTTPException(status_code=400, detail="format must be json or chrome")
+    return trace_buffer.to_json(session)
+
+
+@app.get("/debug/stalls")
+async def get_loop_stalls(limit: int = 20):
+    """Code paths that blocked the event loop longest"""
+    if not LOOP_STALL_DETECTOR:
+        raise HTTPException(
+            status_code=404, detail="Stall detector is disabled (LOOP_STALL_DETECTOR=1)"
+        )
+    return {
+        "threshold_ms": stall_detector.threshold * 1000,
+        "stalls": stall_detector.stalls,
+        "offenders": stall_detector.worst_offenders(limit),
+    }
+
+
 @app.get("/api/")
 async def get_api_info():
     """Basic API info endpoint"""
     return {"message": "AI Dialogue Backend API", "version": "1.0.0"}
 
 
+def serve_asset(path: str, request: Request):
+    """Serve a frontend asset from memory"""
+    asset = asset_store.get(path)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    return asset_store.response(asset, request)
+
+
 @app.get("/")
-async def get_index():
+async def get_index(request: Request):
     """Serve the frontend HTML file"""
-    if os.path.exists("index.html"):
-        return FileResponse("index.html")
+    asset = asset_store.get("/")
+    if asset is not None:
+        return asset_store.response(asset, request)
     else:
         return {
             "message": "AI Dialogue Backend API",
@@ -90,141 +295,293 @@ async def get_index():
         }
 
 
+@app.get("/assets/{name}")
+async def get_hashed_asset(name: str, request: Request):
+    """Serve a content-hashed asset URL, cacheable forever"""
+    asset = asset_store.get_hashed(f"/assets/{name}")
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    return asset_store.response(asset, request, immutable=True)
+
+
 @app.get("/style.css")
-async def get_css():
+async def get_css(request: Request):
     """Serve the CSS file"""
-    return FileResponse("style.css", media_type="text/css")
+    return serve_asset("/style.css", request)
+
+
+@app.get("/sample_conversations.json")
+async def get_sample_conversations(request: Request):
+    """Serve the sample conversation templates"""
+    return serve_asset("/sample_conversations.json", request)
 
 
 @app.get("/script.js")
-async def get_js():
+async def get_js(request: Request):
     """Serve the JavaScript file"""
-    return FileResponse("script.js", media_type="application/javascript")
+    return serve_asset("/script.js", request)
 
 
 @app.get("/logo.svg")
-async def get_logo_svg():
+async def get_logo_svg(request: Request):
     """Serve the logo SVG file"""
-    return FileResponse("static/logo.svg", media_type="image/svg+xml")
+    return serve_asset("/logo.svg", request)
 
 
 @app.get("/logo.png")
-async def get_logo_png():
+async def get_logo_png(request: Request):
     """Serve the logo PNG file"""
-    return FileResponse("static/logo.png", media_type="image/png")
+    return serve_asset("/logo.png", request)
 
 
 @app.get("/preview.png")
-async def get_preview():
+async def get_preview(request: Request):
     """Serve the preview image for social media"""
-    return FileResponse("static/preview.png", media_type="image/png")
+    return serve_asset("/preview.png", request)
+
+
+@app.get("/clips/{clip_id}")
+async def get_clip(clip_id: str, request: Request):
+    """Serve a synthesized clip from the in-memory clip store"""
+    range_header = request.headers.get("range")
+
+    live = await clip_store.call(clip_store.get_live, clip_id)
+    if live is not None:
+        if not range_header or range_header.strip() == "bytes=0-":
+            # Stream audio chunks as the synthesizer produces them
+            return StreamingResponse(
+                live.iter_chunks(),
+                media_type=live.media_type,
+                headers={"Cache-Control": "no-store"},
+            )
+        # Partial ranges need the full length, so wait for synthesis to end
+        await live.wait_finished()
+
+    clip = await clip_store.call(clip_store.get, clip_id)
+    if clip is None:
+        raise HTTPException(status_code=404, detail="Clip not found or expired")
+
+    data = clip.data
+    headers = {"Accept-Ranges": "bytes", "Cache-Control": "private, max-age=600"}
+
+    # Some browsers (Safari) insist on byte ranges for media elements
+    requested = byte_range(range_header, len(data))
+    if requested is not None:
+        start, end = requested
+        if start > end:
+            return Response(
+                status_code=416, headers={"Content-Range": f"bytes */{len(data)}"}
+            )
+        headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+        return Response(
+            content=data[start : end + 1],
+            status_code=206,
+            media_type=clip.media_type,
+            headers=headers,
+        )
+
+    return Response(content=data, media_type=clip.media_type, headers=headers)
+
 
+def byte_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Inclusive (start, end) of the first range in a Range header
 
-async def cleanup_conversation_state(conversation_id: str):
-    """Comprehensively clean up all conversation state"""
-    # Mark conversation as stopped
-    if conversation_id in active_conversations:
-        active_conversations[conversation_id]["stop"] = True
-        del active_conversations[conversation_id]
+    None means the whole body should be sent, as for a header that cannot
+    be parsed (RFC 9110 says to ignore it); start > end means the range
+    cannot be satisfied.
+    """
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+    try:
+        start_text, end_text = range_header[6:].split(",")[0].split("-")
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+        else:
+            start = max(size - int(end_text), 0)
+            end = size - 1
+        return start, min(end, size - 1)
+    except ValueError:
+        return None
+
+
+@app.get("/archive/{conversation_id}")
+async def get_archived_conversation(conversation_id: str):
+    """Transcript, parameters and audio URL of an archived conversation"""
+    conversation = conversation_archive.get(conversation_id)
+    if conversation is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return conversation.to_dict()
+
+
+@app.get("/archive/{conversation_id}/audio.mp3")
+async def get_archived_audio(conversation_id: str, request: Request):
+    """Replay an archived conversation straight from its segment file"""
+    conversation = conversation_archive.get(conversation_id)
+    if conversation is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    # Archived audio never changes, so it can be cached and shared freely
+    etag = f'"{conversation.id}"'
+    headers = {"Accept-Ranges": "bytes", "ETag": etag, "Cache-Control": IMMUTABLE_CACHE}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    audio = conversation_archive.audio(conversation)
+    status_code = 200
+    requested = byte_range(request.headers.get("range"), len(audio))
+    if requested is not None:
+        start, end = requested
+        if start > end:
+            return Response(
+                status_code=416, headers={"Content-Range": f"bytes */{len(audio)}"}
+            )
+        headers["Content-Range"] = f"bytes {start}-{end}/{len(audio)}"
+        audio = audio[start : end + 1]
+        status_code = 206
+
+    headers["Content-Length"] = str(len(audio))
+    return StreamingResponse(
+        iter_chunks(audio),
+        status_code=status_code,
+        media_type="audio/mpeg",
+        headers=headers,
+    )
 
-    # Clear audio events
-    if conversation_id in audio_finished_events:
-        audio_finished_events[conversation_id].set()  # Release any waiting tasks
-        del audio_finished_events[conversation_id]
 
-    # Remove conversation task reference
-    if conversation_id in conversation_tasks:
-        del conversation_tasks[conversation_id]
+@app.get("/sessions/{session_id}/export.mp3")
+async def export_conversation(
+    session_id: str, token: str = "", gap: float = EXPORT_GAP_SECONDS
+):
+    """Download a session's conversation so far as one MP3
+
+    Needs the export token sent to the session's websocket. Sessions live in
+    the worker that accepted them, so other workers answer 404.
+    """
+    session = sessions.get(session_id)
+    if session is None or not secrets.compare_digest(
+        token.encode(), session.export_token.encode()
+    ):
+        raise HTTPException(status_code=404, detail="No conversation audio to export")
+    if not session.recording:
+        raise HTTPException(status_code=404, detail="No conversation audio to export")
+
+    gap = max(0.0, min(gap, MAX_EXPORT_GAP_SECONDS))
+    # Walking the frame headers of a long conversation is kept off the loop
+    export = await asyncio.get_running_loop().run_in_executor(
+        None, Mp3Export, list(session.recording), gap
+    )
+    if not export:
+        raise HTTPException(status_code=404, detail="No conversation audio to export")
+
+    return StreamingResponse(
+        export.iter_chunks(),
+        media_type="audio/mpeg",
+        headers={
+            "Content-Length": str(export.size),
+            "Content-Disposition": 'attachment; filename="conversation.mp3"',
+        },
+    )
 
-    # Stop all audio and clean up files
-    azure_tts.stop_all_audio()
-    azure_tts.cleanup_old_files(max_age_hours=0)  # Clean all current files
 
-    # Small delay to ensure cleanup completes
-    await asyncio.sleep(0.2)
+async def cleanup_conversation_state(session: Session):
+    """Comprehensively clean up all conversation state
 
+    Only the resources owned by this session are released, so other
+    sessions' audio is never touched.
+    """
+    session.end()
 
-async def wait_for_audio_finished(conversation_id: str):
-    """Wait for client to confirm audio playback has finished"""
-    if conversation_id not in audio_finished_events:
-        audio_finished_events[conversation_id] = asyncio.Event()
 
-    event = audio_finished_events[conversation_id]
-    event.clear()
-    await event.wait()
+async def clip_duration(clip_id: str) -> float:
+    """Playback duration of a stored clip in seconds"""
+    clip = await clip_store.call(clip_store.get, clip_id)
+    return clip.duration if clip else 0
 
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
+    try:
+        session = await sessions.create(websocket)
+    except SessionLimitError:
+        # 1013: try again later
+        await websocket.close(code=1013)
+        return
+
     await websocket.accept()
-    conversation_id = str(id(websocket))
 
     try:
         while True:
             data = await websocket.receive_text()
-            message = json.loads(data)
+            try:
+                message = json.loads(data)
+            except ValueError:
+                print(f"Ignoring malformed message from client {session.id}")
+                continue
+            kind = message.get("type") if isinstance(message, dict) else None
 
-            if message["type"] == "start":
+            if kind == "start":
                 # Cancel any existing conversation task for this client
-                if conversation_id in conversation_tasks:
-                    conversation_tasks[conversation_id].cancel()
-                    try:
-                        await conversation_tasks[conversation_id]
-                    except asyncio.CancelledError:
-                        pass
+                await session.cancel_task()
 
                 # Clean up any existing state completely
-                await cleanup_conversation_state(conversation_id)
+                await cleanup_conversation_state(session)
+
+                # Only this client learns the token that unlocks the export
+                await websocket.send_text(
+                    json.dumps(
+                        {
+                            "type": "session",
+                            "id": session.id,
+                            "exportUrl": f"/sessions/{session.id}/export.mp3"
+                            f"?token={session.export_token}",
+                        }
+                    )
+                )
 
                 # Start new conversation in background
-                conversation_tasks[conversation_id] = asyncio.create_task(
-                    run_conversation(
-                        websocket,
-                        conversation_id,
-                        message,
+                try:
+                    await sessions.start(
+                        session, run_conversation(websocket, session, message)
+                    )
+                except SessionLimitError as e:
+                    await websocket.send_text(
+                        json.dumps({"type": "error", "message": str(e)})
                     )
-                )
 
-            elif message["type"] == "stop":
+            elif kind == "stop":
                 # Cancel conversation task immediately
-                if conversation_id in conversation_tasks:
-                    conversation_tasks[conversation_id].cancel()
-                    try:
-                        await conversation_tasks[conversation_id]
-                    except asyncio.CancelledError:
-                        pass
+                await session.cancel_task()
 
                 # Stop conversation and clean up all state
-                if conversation_id in active_conversations:
-                    active_conversations[conversation_id]["stop"] = True
-
-                # Comprehensive cleanup
-                await cleanup_conversation_state(conversation_id)
+                await cleanup_conversation_state(session)
 
-                # Stop any currently playing audio
-                azure_tts.stop_all_audio()
                 await websocket.send_text(json.dumps({"type": "stopped"}))
 
-            elif message["type"] == "audio_finished":
+            elif kind == "audio_finished":
                 # Client confirms audio playback finished
-                if conversation_id in audio_finished_events:
-                    audio_finished_events[conversation_id].set()
+                session.audio_finished.set()
+
+            elif kind == "playback":
+                # Lookahead clients report their playback position
+                if message.get("finished"):
+                    try:
+                        session.report_played(int(message.get("turn")))
+                    except (TypeError, ValueError):
+                        pass
 
     except WebSocketDisconnect:
-        # Cancel conversation task
-        if conversation_id in conversation_tasks:
-            conversation_tasks[conversation_id].cancel()
-            try:
-                await conversation_tasks[conversation_id]
-            except asyncio.CancelledError:
-                pass
+        print(f"Client {session.id} disconnected")
+    finally:
+        # Whatever ended the connection, its conversation must not outlive it
+        await session.cancel_task()
 
         # Comprehensive cleanup
-        await cleanup_conversation_state(conversation_id)
-        print(f"Client {conversation_id} disconnected")
+        await cleanup_conversation_state(session)
+        sessions.remove(session.id)
 
 
-async def run_conversation(websocket: WebSocket, conversation_id: str, config: dict):
+async def run_conversation(websocket: WebSocket, session: Session, config: dict):
     """Run the AI conversation with the same logic as the original script"""
 
     # Extract configuration
@@ -232,20 +589,27 @@ async def run_conversation(websocket: WebSocket, conversation_id: str, config: d
     system2 = config["system2"]
 
     # Initialize conversation state
-    active_conversations[conversation_id] = {"stop": False}
+    session.begin()
 
     async def safe_send(message):
         """Safely send message to websocket, ignoring closed connections"""
         try:
-            if (
-                conversation_id in active_conversations
-                and not active_conversations[conversation_id]["stop"]
-            ):
+            if not session.stop:
                 await websocket.send_text(json.dumps(message))
         except:
             # Connection closed, ignore
             pass
 
+    def notify_queued(upstream):
+        """Callback telling the client where it waits for upstream capacity"""
+
+        def on_queued(position):
+            asyncio.ensure_future(
+                safe_send({"type": "queued", "upstream": upstream, "position": position})
+            )
+
+        return on_queued
+
     # Validate character limits
     if len(system1) > 375:
         await safe_send(
@@ -273,230 +637,630 @@ async def run_conversation(websocket: WebSocket, conversation_id: str, config: d
     response_length1 = config.get("responseLength1", 35)
     response_length2 = config.get("responseLength2", 35)
 
-    # Add comprehensive human-like conversation instructions to system prompts
-    human_conversation_instructions = """
-
-CONVERSATION STYLE:
-- Engage naturally like a real human in casual conversation
-- React emotionally and personally to what the other person says
-- Use conversational flow: ask questions, make observations, share thoughts
-- Show curiosity, agreement, disagreement, surprise, or other natural reactions
-- Build on previous points rather than just stating new arguments
-- Use "I think...", "That's interesting...", "Wait, but...", "You know what..." etc.
-- Include conversational fillers and natural speech patterns
-- Show personality and individual perspective
-- Sometimes go off on tangents or bring up related points
-- React to the other person's tone and adjust accordingly
-
-AVOID:
-- Formal debate structure or academic presentations  
-- Simply stating facts without personal reaction
-- Ignoring what the other person just said
-- Being overly polite or robotic
-- Starting every response the same way"""
-
-    system1_with_limit = (
-        f"{system1}"
-        f"{human_conversation_instructions}"
-        f"\n\nKeep your responses to {response_length1} words maximum."
-    )
-    system2_with_limit = (
-        f"{system2}"
-        f"{human_conversation_instructions}"
-        f"\n\nKeep your responses to {response_length2} words maximum."
-    )
+    # Settings stored with an archived conversation, as start message fields
+    params = {
+        "system1": system1,
+        "system2": system2,
+        "voice1": voice1,
+        "voice2": voice2,
+        "speed1": speed1,
+        "speed2": speed2,
+        "temperature1": temperature1,
+        "temperature2": temperature2,
+        "topP1": top_p1,
+        "topP2": top_p2,
+        "responseLength1": response_length1,
+        "responseLength2": response_length2,
+    }
+
+    # Stream LLM tokens and per-sentence audio (newer clients opt in)
+    streaming = config.get("stream", False)
+
+    # Serve audio progressively while it is being synthesized
+    stream_audio = config.get("streamAudio", STREAM_TTS_AUDIO)
+
+    # Protocol 2 pushes turns into a client-side playback queue instead of
+    # waiting for audio_finished after every turn
+    protocol = 2 if config.get("protocol") == 2 else 1
+    try:
+        playback_buffer = int(config.get("bufferTurns", DEFAULT_PLAYBACK_BUFFER))
+    except (TypeError, ValueError):
+        playback_buffer = DEFAULT_PLAYBACK_BUFFER
+    playback_buffer = max(1, min(playback_buffer, MAX_PLAYBACK_BUFFER))
 
-    async def cleanup_audio_file(audio_file, delay):
-        """Clean up audio file after a delay"""
-        await asyncio.sleep(delay)
-        try:
-            if os.path.exists(audio_file):
-                os.remove(audio_file)
-        except Exception as e:
-            print(f"Could not delete audio file {audio_file}: {e}")
+    # Send each turn's trace to the client as a debug message
+    debug = bool(config.get("debug", False))
 
-    async def play_audio_and_cleanup(text, voice, speed, entity_num):
-        """Generate audio, send to client, wait for client confirmation"""
-        # Check if conversation was stopped before generating audio
-        if active_conversations.get(conversation_id, {}).get("stop", True):
-            return 0
+    # Generate upcoming turns while the current one plays
+    try:
+        lookahead = int(config.get("lookahead", DEFAULT_LOOKAHEAD))
+    except (TypeError, ValueError):
+        lookahead = DEFAULT_LOOKAHEAD
+    lookahead = max(0, min(lookahead, MAX_LOOKAHEAD))
+
+    system1_with_limit = build_system_prompt(system1, response_length1)
+    system2_with_limit = build_system_prompt(system2, response_length2)
 
-        audio_file = await asyncio.get_event_loop().run_in_executor(
-            None, azure_tts.generate_audio_file, text, voice, speed
+    async def synthesize_clip(clip_id, text, voice, speed, trace, segment):
+        """Synthesize text into the clip store, returning whether audio exists"""
+        loop = asyncio.get_running_loop()
+
+        async def run(on_chunk):
+            span = trace.begin("tts", segment=segment)
+            audio = None
+            try:
+                audio = await loop.run_in_executor(
+                    azure_tts.executor,
+                    azure_tts.synthesize_audio,
+                    text,
+                    voice,
+                    speed,
+                    on_chunk,
+                )
+                return audio
+            finally:
+                span.finish(bytes=len(audio) if audio else 0)
+
+        async def synthesize(on_chunk=None):
+            # Admission and throttling backoff are shared with every session
+            try:
+                return await tts_scheduler.call(
+                    session.id,
+                    lambda: run(on_chunk),
+                    on_queued=notify_queued("tts"),
+                )
+            except TTSThrottledError as e:
+                print(f"Giving up on throttled synthesis: {e}")
+                return None
+
+        if not stream_audio:
+            audio = await synthesize()
+            if audio:
+                metrics.clip_bytes.observe(len(audio))
+                await clip_store.call(clip_store.put, audio, "audio/mpeg", clip_id)
+            return bool(audio)
+
+        # Publish chunks as they arrive so the client can start playing early
+        live = clip_store.open_live(clip_id)
+        audio = None
+        try:
+            audio = await synthesize(live.feed)
+        finally:
+            await clip_store.call(clip_store.close_live, clip_id, audio)
+        if audio:
+            metrics.clip_bytes.observe(len(audio))
+        return bool(audio)
+
+    def add_spoken_segment(turn, text):
+        """Queue a piece of the reply and start synthesizing it right away"""
+        clip_id = clip_store.new_id()
+        session.clips.add(clip_id)
+        synthesis = asyncio.ensure_future(
+            synthesize_clip(
+                clip_id, text, turn.voice, turn.speed, turn.trace, len(turn.sentences)
+            )
         )
+        turn.add_segment(text, clip_id, synthesis)
+
+    async def clip_url(clip_id, synthesis):
+        """Return the URL of a segment's audio once the client may fetch it"""
+        if stream_audio:
+            # Live clips are streamed while they are being synthesized
+            return f"/clips/{clip_id}"
+        return f"/clips/{clip_id}" if await synthesis else None
+
+    def llm_span(trace, mode, attempt):
+        """Open a turn's LLM span; the first attempt also ends its queue wait"""
+        if attempt == 0:
+            trace.add("queue_wait", trace.started)
+        return trace.begin("llm", mode=mode, attempt=attempt)
+
+    async def stream_completion(trace, system, history, temperature, top_p):
+        """Stream a completion once admitted by the LLM scheduler
+
+        A throttled request is retried only before its first token arrives;
+        after that the partial reply is already being spoken.
+        """
+        cost = estimate_tokens(system, history)
+        attempt = 0
+        while True:
+            await llm_scheduler.acquire(
+                session.id, cost, notify_queued("llm"), front=attempt > 0
+            )
+            span = llm_span(trace, "stream", attempt)
+            started = False
+            try:
+                async for delta in gpt4o_mini_azure_history_stream(
+                    system=system,
+                    history=history,
+                    key=KEY,
+                    endpoint=ENDPOINT,
+                    temperature=temperature,
+                    top_p=top_p,
+                ):
+                    if not started:
+                        started = True
+                        span.attrs["first_token_ms"] = round(
+                            (time.perf_counter() - span.start) * 1000, 3
+                        )
+                    yield delta
+                return
+            except Exception as e:
+                if started or not is_throttle_error(e) or attempt >= llm_scheduler.max_retries:
+                    raise
+                llm_scheduler.backoff(e, attempt)
+                attempt += 1
+            finally:
+                span.finish()
+
+    async def produce_turn(turn, system, history, temperature, top_p, cacheable=False):
+        """Generate one entity's reply, starting TTS for each piece as soon as
+        its text exists"""
+        # Deterministic replies and the fixed opening line come from the cache
+        key = None
+        cached = None
+        if cacheable or temperature == 0:
+            key = response_key(system, history, temperature, top_p)
+            cached = response_cache.get(key, temperature)
+        try:
+            if cached:
+                turn.trace.add("queue_wait", turn.trace.started)
+                turn.trace.instant("llm", cached=True)
+                if streaming:
+                    for sentence in split_sentences(cached):
+                        add_spoken_segment(turn, sentence)
+                else:
+                    add_spoken_segment(turn, cached)
+            elif streaming:
+                # Cut the token stream into sentences and synthesize each one
+                chunker = SentenceChunker()
+                async for delta in stream_completion(
+                    turn.trace, system, history, temperature, top_p
+                ):
+                    for sentence in chunker.feed(delta):
+                        add_spoken_segment(turn, sentence)
+                tail = chunker.flush()
+                if tail:
+                    add_spoken_segment(turn, tail)
+            else:
+                attempts = 0
+
+                async def complete():
+                    nonlocal attempts
+                    span = llm_span(turn.trace, "complete", attempts)
+                    attempts += 1
+                    try:
+                        return await gpt4o_mini_azure_history_async(
+                            system=system,
+                            history=history,
+                            key=KEY,
+                            endpoint=ENDPOINT,
+                            temperature=temperature,
+                            top_p=top_p,
+                        )
+                    finally:
+                        span.finish()
+
+                response = await llm_scheduler.call(
+                    session.id,
+                    complete,
+                    cost=estimate_tokens(system, history),
+                    on_queued=notify_queued("llm"),
+                )
+                if response:
+                    add_spoken_segment(turn, response)
+        finally:
+            turn.finish()
+        if key and not cached and turn.text:
+            response_cache.put(key, temperature, turn.text)
+        return turn.text
+
+    async def wait_for_playback(trace, duration, sent_at):
+        """Wait for client to confirm audio finished, with timeout fallback"""
+        timed_out = False
+        try:
+            await asyncio.wait_for(
+                session.wait_for_audio_finished(reset=False),
+                timeout=duration + 3,  # Extra buffer for network delays
+            )
+            if session.stop:
+                # Released by a stop rather than by the client
+                return
+            metrics.ack_delay.observe(time.perf_counter() - sent_at - duration)
+        except asyncio.TimeoutError:
+            # Fallback to time-based approach if client doesn't respond
+            timed_out = True
+            metrics.timeouts.inc(stage="client_ack")
+        # Covers the client downloading and playing the audio
+        trace.add(
+            "playback", sent_at, estimated_ms=round(duration * 1000), timed_out=timed_out
+        )
+
+    async def play_audio_and_cleanup(turn):
+        """Send the whole reply with its audio, wait for client confirmation"""
+        item = await turn.segments.get()
+        if item is None or session.stop:
+            return 0
+        text, clip_id, synthesis = item
+        audio_url = await clip_url(clip_id, synthesis)
 
         # Check again after audio generation
-        if active_conversations.get(conversation_id, {}).get("stop", True):
-            # Clean up the generated file and return
-            if audio_file and os.path.exists(audio_file):
-                try:
-                    os.remove(audio_file)
-                except:
-                    pass
+        if session.stop:
+            # Clean up the generated clip and return
+            discard_synthesis(clip_id, synthesis)
             return 0
 
-        audio_url = f"/audio/{os.path.basename(audio_file)}" if audio_file else None
+        # Clear the ack before the audio goes out so an early ack is not lost
+        session.reset_audio_finished()
         await safe_send(
             {
                 "type": "speaking",
-                "entity": entity_num,
+                "entity": turn.entity_num,
                 "audioUrl": audio_url,
                 "text": text,
             }
         )
+        sent_at = time.perf_counter()
+        turn.trace.instant("send", segment=0)
 
         duration = 0
-        if audio_file:
-            # Calculate duration based on file format
-            if audio_file.endswith(".mp3"):
-                # For MP3 files, estimate duration based on file size
-                # This is a rough estimate: MP3 48kbps ≈ 6KB per second
-                try:
-                    file_size = os.path.getsize(audio_file)
-                    # Estimate for 48kbps MP3: roughly 6KB per second
-                    duration = file_size / 6000
-                except:
-                    duration = 5  # Fallback duration
-            else:
-                # For WAV files, use wave module
-                try:
-                    import wave
+        if await synthesis:
+            duration = await clip_duration(clip_id)
 
-                    with wave.open(audio_file, "rb") as wav_file:
-                        duration = wav_file.getnframes() / wav_file.getframerate()
-                except:
-                    duration = 5  # Fallback duration
+            # Expire the clip once it has had time to play (extra buffer time)
+            clip_store.expire_in(clip_id, duration + 5)
 
-            # Schedule cleanup in background (extra buffer time)
-            asyncio.create_task(cleanup_audio_file(audio_file, duration + 5))
-
-            # Wait for client to confirm audio finished, with timeout fallback
-            try:
-                await asyncio.wait_for(
-                    wait_for_audio_finished(conversation_id),
-                    timeout=duration + 3,  # Extra buffer for network delays
-                )
-            except asyncio.TimeoutError:
-                # Fallback to time-based approach if client doesn't respond
-                pass
-            except asyncio.CancelledError:
-                # Conversation was cancelled during audio playback
-                if audio_file and os.path.exists(audio_file):
-                    try:
-                        os.remove(audio_file)
-                    except:
-                        pass
-                raise
+            await wait_for_playback(turn.trace, duration, sent_at)
 
         # Final check before sending finished_speaking
-        if not active_conversations.get(conversation_id, {}).get("stop", True):
+        if not session.stop:
             await safe_send({"type": "finished_speaking"})
 
         # Small buffer to ensure clean transition
         await asyncio.sleep(0.1)
         return duration
 
-    try:
-        # Get Azure OpenAI credentials
-        KEY = os.getenv("AZURE_OPENAI_KEY_DE_4_1")
-        ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT_DE_4_1")
+    async def send_turn(turn, expire_after=0.0):
+        """Push each sentence and its audio to the client as soon as it is ready
+
+        Returns the turn's audio duration and when its first audio went out,
+        or None if the conversation stopped meanwhile. Clips are kept until
+        expire_after seconds of earlier audio plus the turn itself have had
+        time to play.
+        """
+        tag = {"entity": turn.entity_num}
+        if protocol == 2:
+            tag["turn"] = turn.trace.index
+        await safe_send({"type": "speaking_start", **tag})
+
+        clips = []
+        sent_at = None
+        while True:
+            item = await turn.segments.get()
+            if item is None:
+                break
+            sentence, clip_id, synthesis = item
+            audio_url = await clip_url(clip_id, synthesis)
 
-        if not KEY or not ENDPOINT:
-            await safe_send(
-                {"type": "error", "message": "Azure OpenAI credentials not found"}
-            )
-            return
+            if session.stop:
+                discard_synthesis(clip_id, synthesis)
+                return None
 
-        # Initialize conversation
-        seed = gpt4o_mini_azure_history(
-            system=system1_with_limit,
-            history=[
+            await safe_send(
                 {
-                    "role": "user",
-                    "content": f"Make a first response based on your system prompt: {system1_with_limit}",
+                    "type": "speaking_chunk",
+                    **tag,
+                    "index": len(clips),
+                    "audioUrl": audio_url,
+                    "text": sentence,
                 }
-            ],
-            key=KEY,
-            endpoint=ENDPOINT,
-            temperature=temperature1,
-            top_p=top_p1,
-        )
-
-        liberal_history = [{"role": "user", "content": seed}]
-        republican_history = []
+            )
+            if sent_at is None:
+                sent_at = time.perf_counter()
+            turn.trace.instant("send", segment=len(clips))
+            clips.append((clip_id, synthesis))
+
+        await safe_send({"type": "speaking_end", **tag, "text": turn.text})
+
+        total_duration = 0
+        for clip_id, synthesis in clips:
+            if await synthesis:
+                total_duration += await clip_duration(clip_id)
+                # Segments play back to back, so keep each clip until the
+                # whole turn so far has had time to play
+                clip_store.expire_in(clip_id, expire_after + total_duration + 5)
+        return total_duration, sent_at if sent_at is not None else time.perf_counter()
+
+    async def play_streaming(turn):
+        """Send a turn as it is generated and wait for the client to play it"""
+        session.reset_audio_finished()
+        sent = await send_turn(turn)
+        if sent is None:
+            return 0
+        total_duration, sent_at = sent
 
-        # Generate and send first response
-        await play_audio_and_cleanup(seed, voice1, speed1, 1)
+        if total_duration:
+            await wait_for_playback(turn.trace, total_duration, sent_at)
 
-        # Check if stopped
-        if active_conversations[conversation_id]["stop"]:
-            return
+        if not session.stop:
+            await safe_send({"type": "finished_speaking"})
+        return total_duration
+
+    async def record_turn(trace):
+        """Keep a played turn's trace and show it to debugging clients"""
+        trace_buffer.add(trace)
+        if debug:
+            await safe_send({"type": "debug", "trace": trace.to_dict()})
+
+    # Turns pushed to a lookahead client that it has not finished playing,
+    # as (trace, duration, sent_at), and when it finished the previous one
+    unplayed: deque = deque()
+    played_at = 0.0
+
+    async def drain_playback(keep):
+        """Wait until at most `keep` pushed turns remain unplayed
+
+        Each turn is assumed played once its audio has had time to play
+        after the previous one, so a silent client cannot stall the
+        conversation.
+        """
+        nonlocal played_at
+        while len(unplayed) > keep and not session.stop:
+            trace, duration, sent_at = unplayed[0]
+            started = max(sent_at, played_at)
+            deadline = started + duration + 3  # Extra buffer for network delays
+            timed_out = False
+            while session.played < trace.index and not session.stop:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    timed_out = True
+                    break
+                session.reset_audio_finished()
+                if session.played >= trace.index:
+                    break
+                try:
+                    await asyncio.wait_for(
+                        session.wait_for_audio_finished(reset=False), timeout=remaining
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                if session.stop:
+                    return
 
-        # Get response from entity 2
-        response = gpt4o_mini_azure_history(
-            system=system2_with_limit,
-            history=liberal_history,
-            key=KEY,
-            endpoint=ENDPOINT,
-            temperature=temperature2,
-            top_p=top_p2,
+            unplayed.popleft()
+            played_at = time.perf_counter()
+            if timed_out:
+                metrics.timeouts.inc(stage="client_ack")
+            else:
+                metrics.ack_delay.observe(played_at - started - duration)
+            trace.add(
+                "playback", started, estimated_ms=round(duration * 1000), timed_out=timed_out
+            )
+            await record_turn(trace)
+
+    # Turns are generated by a background producer and played in order here.
+    # The semaphore bounds how far generation may run ahead of playback
+    turns: asyncio.Queue = asyncio.Queue()
+    ahead = asyncio.Semaphore(lookahead + 1)
+
+    # One shared record of the conversation; each entity gets a role view of it
+    transcript = Transcript()
+    summarizing = None
+    turn_count = 0
+
+    # Notices the speakers echoing each other; the first time they are
+    # nudged for a round, the second time the conversation ends
+    repetition = RepetitionMonitor()
+    nudged = False
+    nudge_turns = 0
+
+    async def summarize_turns(summary, dropped):
+        """Condense turns that left the prompt window into a short summary"""
+        request = "\n".join(dropped)
+        if summary:
+            request = f"Summary so far: {summary}\n\nLater turns:\n{request}"
+        history = [{"role": "user", "content": request}]
+        system = (
+            "Summarize this conversation between two speakers in at most 80 "
+            "words. Keep each speaker's positions and any open questions."
+        )
+        try:
+            return await llm_scheduler.call(
+                session.id,
+                lambda: gpt4o_mini_azure_history_async(
+                    system=system,
+                    history=history,
+                    key=KEY,
+                    endpoint=ENDPOINT,
+                    temperature=0.3,
+                ),
+                cost=estimate_tokens(system, history),
+            )
+        except Exception as e:
+            print(f"Error summarizing conversation: {e}")
+            return None
+
+    async def speak(entity_num, history=None):
+        """Generate the next reply for an entity once the lookahead allows it"""
+        nonlocal summarizing, turn_count, nudge_turns
+        # The trace starts before the lookahead wait, which counts as queueing
+        trace = TurnTrace(session.id, turn_count, entity_num)
+        turn_count += 1
+        await ahead.acquire()
+        if entity_num == 1:
+            turn = Turn(1, voice1, speed1, trace)
+            system, temperature, top_p = system1_with_limit, temperature1, top_p1
+        else:
+            turn = Turn(2, voice2, speed2, trace)
+            system, temperature, top_p = system2_with_limit, temperature2, top_p2
+        turns.put_nowait(turn)
+        if nudge_turns:
+            system += REPETITION_NUDGE
+            nudge_turns -= 1
+        # Only the opening line has a fixed history worth caching at any temperature
+        cacheable = history is not None
+        if history is None:
+            history = transcript.messages_for(entity_num)
+        response = await produce_turn(
+            turn, system, history, temperature, top_p, cacheable
         )
-
-        await play_audio_and_cleanup(response, voice2, speed2, 2)
 
         if response:
-            republican_history.append({"role": "user", "content": response})
-            liberal_history.append({"role": "assistant", "content": response})
+            transcript.append(entity_num, response)
+            if REPETITION_DETECTION:
+                score = repetition.observe(response)
+                trace.instant("repetition", score=round(score, 2))
+            if TRANSCRIPT_SUMMARIZE and transcript.needs_summary():
+                if summarizing is None or summarizing.done():
+                    summarizing = asyncio.ensure_future(
+                        transcript.summarize(summarize_turns)
+                    )
+        return response
+
+    async def keep_going():
+        """Steer a conversation that has stalled, or end it if it stalls again
+
+        Returns False when the conversation should end early.
+        """
+        nonlocal nudged, nudge_turns
+        if not REPETITION_DETECTION or not repetition.stalled:
+            return True
+        if nudged:
+            repetition_actions.inc(action="end")
+            print(f"Ending repetitive conversation for session {session.id}")
+            await safe_send({"type": "ended", "reason": "repetition"})
+            return False
+        repetition_actions.inc(action="nudge")
+        nudged = True
+        # One nudged reply from each speaker
+        nudge_turns = 2
+        repetition.clear_streak()
+        return True
+
+    async def generate_turns():
+        """Generate every reply in conversation order"""
+        try:
+            # Initialize conversation
+            await speak(1, opener_history(system1_with_limit))
+
+            # Get response from entity 2
+            await speak(2)
+
+            # Main conversation loop - limit to 10 rounds (20 total interactions)
+            for i in range(10):
+                # Entity 1 response
+                if not await keep_going():
+                    break
+                await speak(1)
+
+                # Entity 2 response
+                if not await keep_going():
+                    break
+                await speak(2)
+        finally:
+            if summarizing is not None:
+                summarizing.cancel()
+            turns.put_nowait(None)
+
+    async def archive_conversation():
+        """Store the finished conversation and tell the client where it is"""
+        try:
+            conversation_id = await asyncio.get_running_loop().run_in_executor(
+                None,
+                conversation_archive.add,
+                list(session.history),
+                list(session.recording),
+                params,
+            )
+        except Exception as e:
+            metrics.errors.inc(stage="archive")
+            print(f"Error archiving conversation: {e}")
+            return
+        if conversation_id:
+            await safe_send(
+                {
+                    "type": "archived",
+                    "id": conversation_id,
+                    "url": f"/archive/{conversation_id}",
+                }
+            )
 
-        # Main conversation loop - limit to 10 rounds (20 total interactions)
-        for i in range(10):
-            if active_conversations[conversation_id]["stop"]:
-                break
+    producer = None
+    current_turn = None
+    try:
+        # Get Azure OpenAI credentials
+        KEY = os.getenv("AZURE_OPENAI_KEY_DE_4_1")
+        ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT_DE_4_1")
 
-            # Entity 1 response
-            response = gpt4o_mini_azure_history(
-                system=system1_with_limit,
-                history=republican_history,
-                key=KEY,
-                endpoint=ENDPOINT,
-                temperature=temperature1,
-                top_p=top_p1,
+        if not KEY or not ENDPOINT:
+            await safe_send(
+                {"type": "error", "message": "Azure OpenAI credentials not found"}
             )
+            return
 
-            if response:
-                liberal_history.append({"role": "user", "content": response})
-                republican_history.append({"role": "assistant", "content": response})
-
-            await play_audio_and_cleanup(response, voice1, speed1, 1)
+        producer = asyncio.create_task(generate_turns())
 
-            if active_conversations[conversation_id]["stop"]:
+        while True:
+            current_turn = await turns.get()
+            if current_turn is None:
                 break
 
-            # Entity 2 response
-            response = gpt4o_mini_azure_history(
-                system=system2_with_limit,
-                history=liberal_history,
-                key=KEY,
-                endpoint=ENDPOINT,
-                temperature=temperature2,
-                top_p=top_p2,
-            )
-
-            if response:
-                republican_history.append({"role": "user", "content": response})
-                liberal_history.append({"role": "assistant", "content": response})
+            if protocol == 2:
+                # Push the turn into the client's queue, then wait only if
+                # its buffer is full
+                queued = sum(duration for _, duration, _ in unplayed)
+                sent = await send_turn(current_turn, expire_after=queued)
+                if sent is not None:
+                    unplayed.append((current_turn.trace, *sent))
+            elif streaming:
+                await play_streaming(current_turn)
+            else:
+                await play_audio_and_cleanup(current_turn)
+            if current_turn.text:
+                session.history.append(
+                    {"entity": current_turn.entity_num, "text": current_turn.text}
+                )
+                # Keep the audio for export once its clips have expired
+                session.record(await current_turn.audio())
+            if protocol != 2:
+                await record_turn(current_turn.trace)
+            current_turn = None
+            ahead.release()
+            await drain_playback(playback_buffer)
+
+            # Check if stopped
+            if session.stop:
+                break
 
-            await play_audio_and_cleanup(response, voice2, speed2, 2)
+        if not session.stop:
+            # Surface errors raised while generating
+            await producer
+            if ARCHIVE_CONVERSATIONS:
+                await archive_conversation()
+            # Let a lookahead client play out its queue before cleanup
+            await drain_playback(0)
 
     except asyncio.CancelledError:
         # Conversation was cancelled - clean up gracefully
-        await cleanup_conversation_state(conversation_id)
+        await cleanup_conversation_state(session)
         raise
     except Exception as e:
+        metrics.errors.inc(stage="conversation")
         await safe_send({"type": "error", "message": str(e)})
     finally:
+        # Discard speculatively generated turns that will never be played
+        if producer:
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+        if current_turn:
+            current_turn.discard()
+        while not turns.empty():
+            turn = turns.get_nowait()
+            if turn is not None:
+                turn.discard()
+
         # Comprehensive cleanup
-        await cleanup_conversation_state(conversation_id)
+        await cleanup_conversation_state(session)
 
 
 if __name__ == "__main__":
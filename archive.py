@@ -0,0 +1,183 @@
+import json
+import mmap
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from audio_export import EXPORT_GAP_SECONDS, Mp3Export
+from audio_store import connect_state_db
+
+# Opt-in: finished conversations are kept on disk until deleted by hand
+ARCHIVE_CONVERSATIONS = os.getenv("ARCHIVE_CONVERSATIONS", "0") == "1"
+ARCHIVE_DIR = os.getenv(
+    "ARCHIVE_DIR", os.path.join(os.path.dirname(__file__), "archive")
+)
+# A new segment file is started once the current one reaches this size
+ARCHIVE_SEGMENT_BYTES = int(os.getenv("ARCHIVE_SEGMENT_MB", "256")) * 1024 * 1024
+
+INDEX_FILE = "index.sqlite3"
+
+
+class ArchivedConversation(NamedTuple):
+    id: str
+    created_at: float
+    segment: str
+    offset: int
+    length: int
+    duration: float
+    params: Dict[str, Any]
+    # [{"entity", "text", "start", "offset"}]; start and offset locate the
+    # turn's audio in seconds and bytes, or are None if it had none
+    turns: List[Dict[str, Any]]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "created_at": self.created_at,
+            "duration": round(self.duration, 3),
+            "bytes": self.length,
+            "params": self.params,
+            "turns": self.turns,
+            "audio": f"/archive/{self.id}/audio.mp3",
+        }
+
+
+class ConversationArchive:
+    """Finished conversations in append-only segment files with an offset index
+
+    Each conversation's audio is written once, as a single MP3, to the end
+    of this worker's current segment file; a SQLite index maps its id to
+    (segment, offset, length) along with the transcript and parameters.
+    Segments are never rewritten, so they are memory-mapped and replays are
+    served as slices of the mapping without copying the audio.
+    """
+
+    def __init__(
+        self, directory: str = ARCHIVE_DIR, segment_bytes: int = ARCHIVE_SEGMENT_BYTES
+    ):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        # _lock guards the index and the maps; appends hold _write_lock so
+        # that fsync never keeps a replay waiting
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._db = None
+        # Segment file this worker appends to; other workers use their own
+        self._segment = None
+        self._segment_name: Optional[str] = None
+        self._maps: Dict[str, mmap.mmap] = {}
+
+    def _index(self):
+        """The index connection, created with the directory on first use"""
+        if self._db is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._db = connect_state_db(os.path.join(self.directory, INDEX_FILE))
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS conversations (id TEXT PRIMARY KEY,"
+                " created_at REAL, segment TEXT, offset INTEGER, length INTEGER,"
+                " duration REAL, params TEXT, turns TEXT)"
+            )
+        return self._db
+
+    def _segment_for(self, length: int):
+        """The open segment file, rolled over when the next write would overflow it"""
+        if self._segment is not None and self._segment.tell() + length > self.segment_bytes:
+            self._segment.close()
+            self._segment = None
+        if self._segment is None:
+            self._segment_name = f"{uuid.uuid4().hex}.seg"
+            self._segment = open(os.path.join(self.directory, self._segment_name), "ab")
+        return self._segment
+
+    def add(
+        self,
+        history: List[Dict[str, Any]],
+        recording: List[bytes],
+        params: Dict[str, Any],
+        gap: float = EXPORT_GAP_SECONDS,
+    ) -> Optional[str]:
+        """Archive a conversation, returning its id (None if it has no audio)
+
+        history and recording hold one entry per turn, as kept by the session.
+        Blocks on disk I/O, so run it in an executor.
+        """
+        export = Mp3Export(recording, gap)
+        if not export:
+            return None
+        turns = [
+            {
+                "entity": turn["entity"],
+                "text": turn["text"],
+                "start": round(start, 3) if start is not None else None,
+                "offset": offset,
+            }
+            for turn, start, offset in zip(
+                history, export.clip_starts, export.clip_offsets
+            )
+        ]
+        conversation_id = uuid.uuid4().hex
+
+        with self._write_lock:
+            with self._lock:
+                db = self._index()
+            segment = self._segment_for(export.size)
+            segment_name = self._segment_name
+            offset = segment.tell()
+            for part in export.parts:
+                segment.write(part)
+            segment.flush()
+            os.fsync(segment.fileno())
+
+        # Index only audio that is safely on disk; bytes orphaned by a crash
+        # before this point are never referenced
+        with self._lock:
+            db.execute(
+                "INSERT INTO conversations VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    conversation_id,
+                    time.time(),
+                    segment_name,
+                    offset,
+                    export.size,
+                    export.duration,
+                    json.dumps(params),
+                    json.dumps(turns),
+                ),
+            )
+        return conversation_id
+
+    def get(self, conversation_id: str) -> Optional[ArchivedConversation]:
+        with self._lock:
+            if self._db is None and not os.path.exists(
+                os.path.join(self.directory, INDEX_FILE)
+            ):
+                return None
+            row = self._index().execute(
+                "SELECT id, created_at, segment, offset, length, duration, params, turns"
+                " FROM conversations WHERE id = ?",
+                (conversation_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return ArchivedConversation(
+            *row[:6], params=json.loads(row[6]), turns=json.loads(row[7])
+        )
+
+    def audio(self, conversation: ArchivedConversation) -> memoryview:
+        """A conversation's MP3 as a view into its memory-mapped segment"""
+        end = conversation.offset + conversation.length
+        with self._lock:
+            mapping = self._maps.get(conversation.segment)
+            if mapping is None or len(mapping) < end:
+                # Map the segment, again if it has grown since; older maps
+                # stay alive for as long as responses still read from them
+                with open(os.path.join(self.directory, conversation.segment), "rb") as f:
+                    mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps[conversation.segment] = mapping
+        return memoryview(mapping)[conversation.offset : end]
+
+
+# Create global instance
+conversation_archive = ConversationArchive()
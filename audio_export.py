@@ -0,0 +1,142 @@
+import os
+import struct
+from typing import Iterable, Iterator, List, Optional
+
+from audio_metadata import iter_mp3_frames, parse_frame_header, side_info_length
+
+# Silence inserted between turns of an export, and the most a client may ask for
+EXPORT_GAP_SECONDS = float(os.getenv("EXPORT_GAP_SECONDS", "0.4"))
+MAX_EXPORT_GAP_SECONDS = 5.0
+# Audio a session keeps for export; turns past the cap are left out
+EXPORT_MAX_BYTES = int(os.getenv("EXPORT_MAX_MB", "4")) * 1024 * 1024
+
+# Bytes handed to a streaming response per chunk
+CHUNK_BYTES = 64 * 1024
+
+# Xing/Info header fields present: frame count and byte count
+_INFO_FLAGS = 0x01 | 0x02
+
+
+def iter_chunks(
+    view: memoryview, chunk_size: int = CHUNK_BYTES
+) -> Iterator[memoryview]:
+    """Slices of a view for a streaming response, without copying"""
+    for start in range(0, len(view), chunk_size):
+        yield view[start : start + chunk_size]
+
+
+def _plain_header(header: bytes) -> bytes:
+    """A frame header without CRC protection or padding, for generated frames"""
+    return bytes([header[0], header[1] | 0x01, header[2] & ~0x02 & 0xFF, header[3]])
+
+
+def _format_key(header: bytes) -> tuple:
+    """Fields that must match for frames to share one Xing/Info header:
+    version, layer, sample rate and channel mode"""
+    return (header[1] & 0x1E, header[2] & 0x0C, header[3] & 0xC0)
+
+
+def empty_frame(header: bytes) -> bytes:
+    """A frame with no audio data, which decodes to silence"""
+    header = _plain_header(header)
+    frame = parse_frame_header(header + bytes(4), 0)
+    return header + bytes(frame.length - 4)
+
+
+def info_frame(header: bytes, frames: int, size: int, vbr: bool) -> bytes:
+    """A Xing/Info frame announcing the frame count and byte size of a stream
+
+    size excludes the Info frame itself, which is added here.
+    """
+    body = bytearray(empty_frame(header))
+    offset = 4 + side_info_length(header)
+    tag = b"Xing" if vbr else b"Info"
+    body[offset : offset + 16] = tag + struct.pack(
+        ">III", _INFO_FLAGS, frames, size + len(body)
+    )
+    return bytes(body)
+
+
+class Mp3Export:
+    """Clips joined into one MP3 by concatenating their frames
+
+    Nothing is decoded or re-encoded. Each clip's ID3 tags and Xing/Info
+    frame are dropped, optional silent frames separate the clips, and a new
+    Info frame describing the whole stream goes in front so players show
+    the right duration. For each clip, clip_offsets and clip_starts give
+    the byte offset and time where its audio begins, or None if it had none.
+    """
+
+    def __init__(self, clips: Iterable[bytes], gap: float = 0.0):
+        self.parts: List[memoryview] = []
+        self.duration = 0.0
+        self.clip_offsets: List[Optional[int]] = []
+        self.clip_starts: List[Optional[float]] = []
+        position = 0
+        header: Optional[bytes] = None
+        format_key = None
+        uniform = True
+        bitrates = set()
+        frames = 0
+        silence = b""
+
+        for clip in clips:
+            view = memoryview(clip)
+            run_start = run_end = None
+            first_in_clip = True
+            self.clip_offsets.append(None)
+            self.clip_starts.append(None)
+            for frame in iter_mp3_frames(clip):
+                if frame.is_info:
+                    continue
+                frame_header = bytes(view[frame.offset : frame.offset + 4])
+                if header is None:
+                    header = frame_header
+                    format_key = _format_key(header)
+                    silence = empty_frame(header)
+                    frame_seconds = frame.samples / frame.sample_rate
+                    silent_frames = round(max(0.0, gap) / frame_seconds)
+                    silence *= silent_frames
+                elif first_in_clip and silence:
+                    self.parts.append(memoryview(silence))
+                    position += len(silence)
+                    frames += silent_frames
+                    self.duration += silent_frames * frame_seconds
+                if first_in_clip:
+                    self.clip_offsets[-1] = position
+                    self.clip_starts[-1] = self.duration
+                first_in_clip = False
+                uniform = uniform and _format_key(frame_header) == format_key
+                bitrates.add(frame_header[2] >> 4)
+                frames += 1
+                position += frame.length
+                self.duration += frame.samples / frame.sample_rate
+
+                # Contiguous frames are served as one slice
+                if run_end == frame.offset:
+                    run_end += frame.length
+                else:
+                    if run_start is not None:
+                        self.parts.append(view[run_start:run_end])
+                    run_start, run_end = frame.offset, frame.offset + frame.length
+            if run_start is not None:
+                self.parts.append(view[run_start:run_end])
+
+        # Only a stream of one format can be described by a single header
+        if header is not None and uniform:
+            info = info_frame(header, frames, position, len(bitrates) > 1)
+            self.parts.insert(0, memoryview(info))
+            position += len(info)
+            self.clip_offsets = [
+                offset + len(info) if offset is not None else None
+                for offset in self.clip_offsets
+            ]
+        self.size = position
+
+    def __bool__(self) -> bool:
+        return self.size > 0
+
+    def iter_chunks(self, chunk_size: int = CHUNK_BYTES) -> Iterator[memoryview]:
+        """Slices of the clips' own buffers, without copying them"""
+        for part in self.parts:
+            yield from iter_chunks(part, chunk_size)
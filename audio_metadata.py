@@ -0,0 +1,137 @@
+import io
+import wave
+from typing import Iterator, NamedTuple, Optional
+
+# Bitrates in kbps indexed by [version is MPEG1][layer][bitrate index]
+_BITRATES = {
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+
+# Sample rates indexed by version bits (0 = MPEG2.5, 2 = MPEG2, 3 = MPEG1)
+_SAMPLE_RATES = {
+    0: [11025, 12000, 8000],
+    2: [22050, 24000, 16000],
+    3: [44100, 48000, 32000],
+}
+
+
+class Mp3Frame(NamedTuple):
+    offset: int
+    length: int
+    samples: int
+    sample_rate: int
+    is_info: bool  # Xing/Info/VBRI header frame, carries no audio
+
+
+def side_info_length(header: bytes) -> int:
+    """Length of the Layer III side information that follows a frame header"""
+    mpeg1 = ((header[1] >> 3) & 0x03) == 3
+    mono = (header[3] >> 6) == 3
+    if mpeg1:
+        return 17 if mono else 32
+    return 9 if mono else 17
+
+
+def parse_frame_header(data: bytes, offset: int) -> Optional[Mp3Frame]:
+    """Parse the 4-byte MPEG audio frame header at offset"""
+    if offset + 4 > len(data):
+        return None
+    b1, b2 = data[offset + 1], data[offset + 2]
+    if data[offset] != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+
+    version_bits = (b1 >> 3) & 0x03
+    layer_bits = (b1 >> 1) & 0x03
+    bitrate_index = (b2 >> 4) & 0x0F
+    rate_index = (b2 >> 2) & 0x03
+    padding = (b2 >> 1) & 0x01
+
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    mpeg1 = version_bits == 3
+    layer = 4 - layer_bits
+    bitrate = _BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version_bits][rate_index]
+
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 2:
+        samples = 1152
+        length = 144 * bitrate // sample_rate + padding
+    else:
+        samples = 1152 if mpeg1 else 576
+        length = (144 if mpeg1 else 72) * bitrate // sample_rate + padding
+
+    # Xing/Info tags sit after the side information of the first frame
+    side_info = side_info_length(data[offset : offset + 4])
+    tag = data[offset + 4 + side_info : offset + 8 + side_info]
+    is_info = tag in (b"Xing", b"Info") or data[offset + 36 : offset + 40] == b"VBRI"
+
+    return Mp3Frame(offset, length, samples, sample_rate, is_info)
+
+
+def id3v2_size(data: bytes) -> int:
+    """Length of a leading ID3v2 tag, 0 if there is none"""
+    if len(data) < 10 or data[:3] != b"ID3":
+        return 0
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def iter_mp3_frames(data: bytes) -> Iterator[Mp3Frame]:
+    """Walk the MPEG audio frames of an in-memory MP3 buffer"""
+    offset = id3v2_size(data)
+    end = len(data)
+    # Ignore a trailing ID3v1 tag
+    if end >= 128 and data[end - 128 : end - 125] == b"TAG":
+        end -= 128
+
+    while offset + 4 <= end:
+        frame = parse_frame_header(data, offset)
+        if frame is None or frame.length <= 0:
+            # Lost sync: scan forward to the next frame header
+            offset = data.find(b"\xff", offset + 1, end)
+            if offset < 0:
+                return
+            continue
+        if offset + frame.length > end:
+            return
+        yield frame
+        offset += frame.length
+
+
+def mp3_duration(data: bytes) -> float:
+    """Exact playback duration of an MP3 buffer in seconds"""
+    duration = 0.0
+    for frame in iter_mp3_frames(data):
+        if not frame.is_info:
+            duration += frame.samples / frame.sample_rate
+    return duration
+
+
+def wav_duration(data: bytes) -> float:
+    """Playback duration of a WAV buffer in seconds"""
+    with wave.open(io.BytesIO(data), "rb") as wav_file:
+        return wav_file.getnframes() / wav_file.getframerate()
+
+
+def audio_duration(data: bytes, media_type: str = "audio/mpeg") -> float:
+    """Playback duration of an in-memory clip, falling back to a bitrate estimate"""
+    try:
+        if media_type in ("audio/wav", "audio/x-wav", "audio/wave"):
+            return wav_duration(data)
+        duration = mp3_duration(data)
+        if duration > 0:
+            return duration
+    except Exception as e:
+        print(f"Could not parse audio duration: {e}")
+    # Rough estimate: MP3 48kbps ≈ 6KB per second
+    return len(data) / 6000
@@ -0,0 +1,578 @@
+import asyncio
+import heapq
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional
+from audio_metadata import audio_duration
+
+# Bounds for the in-memory clip store
+CLIP_STORE_MAX_BYTES = int(os.getenv("CLIP_STORE_MAX_MB", "64")) * 1024 * 1024
+CLIP_TTL_SECONDS = float(os.getenv("CLIP_TTL_SECONDS", "600"))
+
+# How often the janitor checks the expiry heap
+JANITOR_INTERVAL_SECONDS = 1.0
+
+# "memory" keeps state in this process; "sqlite" shares it between the
+# workers of one node through a database file
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+STATE_DB_PATH = os.getenv(
+    "STATE_DB_PATH", os.path.join(os.path.dirname(__file__), "babel_state.sqlite3")
+)
+
+# How often readers on other workers poll a clip that is still synthesizing
+LIVE_POLL_SECONDS = 0.05
+
+
+class Clip:
+    """A synthesized audio clip held in memory"""
+
+    __slots__ = ("data", "media_type", "duration", "expires_at")
+
+    def __init__(
+        self,
+        data: bytes,
+        media_type: str,
+        expires_at: float,
+        duration: Optional[float] = None,
+    ):
+        self.data = data
+        self.media_type = media_type
+        # Exact playback length, parsed once from the frame headers
+        self.duration = (
+            duration if duration is not None else audio_duration(data, media_type)
+        )
+        self.expires_at = expires_at
+
+
+class LiveClip:
+    """A clip that is still being synthesized
+
+    The TTS thread appends chunks through feed(); readers on the event loop
+    follow along with iter_chunks() and receive audio as soon as it exists.
+    """
+
+    def __init__(self, media_type: str = "audio/mpeg"):
+        self.media_type = media_type
+        self.chunks: List[bytes] = []
+        self.done = False
+        self._loop = asyncio.get_running_loop()
+        self._changed = asyncio.Event()
+
+    def feed(self, chunk: bytes):
+        """Append a chunk, safe to call from any thread"""
+        self._loop.call_soon_threadsafe(self._append, chunk)
+
+    def finish(self):
+        """Mark the clip complete, safe to call from any thread"""
+        self._loop.call_soon_threadsafe(self._finish)
+
+    def _append(self, chunk: bytes):
+        self.chunks.append(chunk)
+        self._changed.set()
+
+    def _finish(self):
+        self.done = True
+        self._changed.set()
+
+    async def wait_finished(self):
+        while not self.done:
+            self._changed.clear()
+            await self._changed.wait()
+
+    async def iter_chunks(self) -> AsyncIterator[bytes]:
+        """Yield every chunk so far, then new chunks until the clip is done"""
+        index = 0
+        while True:
+            while index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            if self.done:
+                return
+            self._changed.clear()
+            await self._changed.wait()
+
+
+class ClipStore:
+    """Bounded in-memory store for synthesized audio clips
+
+    Clips expire after a TTL and the oldest clips are evicted once the total
+    size exceeds the byte cap, so memory stays bounded under load without any
+    files being written to disk. Expiry times are kept in a heap that a single
+    background janitor drains, so purging costs O(expired clips).
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = CLIP_STORE_MAX_BYTES,
+        ttl_seconds: float = CLIP_TTL_SECONDS,
+    ):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.total_bytes = 0
+        self._clips: "OrderedDict[str, Clip]" = OrderedDict()
+        self._live: Dict[str, LiveClip] = {}
+        self._lock = threading.Lock()
+        # (expires_at, clip_id) entries; stale entries are skipped when popped
+        self._expiry_heap: List = []
+
+    def new_id(self) -> str:
+        """Allocate a unique clip id"""
+        return uuid.uuid4().hex
+
+    def put(
+        self, data: bytes, media_type: str = "audio/mpeg", clip_id: Optional[str] = None
+    ) -> str:
+        """Store a clip and return its id"""
+        clip_id = clip_id or self.new_id()
+        now = time.monotonic()
+        clip = Clip(data, media_type, now + self.ttl_seconds)
+        with self._lock:
+            self._remove(clip_id)
+            self._clips[clip_id] = clip
+            heapq.heappush(self._expiry_heap, (clip.expires_at, clip_id))
+            self.total_bytes += len(data)
+
+            # Evict the oldest clips once over the byte cap
+            while self.total_bytes > self.max_bytes and len(self._clips) > 1:
+                _, evicted = self._clips.popitem(last=False)
+                self.total_bytes -= len(evicted.data)
+        return clip_id
+
+    def get(self, clip_id: str) -> Optional[Clip]:
+        """Return a clip if it exists and has not expired"""
+        with self._lock:
+            clip = self._clips.get(clip_id)
+            if clip is None:
+                return None
+            if clip.expires_at <= time.monotonic():
+                self._remove(clip_id)
+                return None
+            return clip
+
+    def open_live(self, clip_id: str, media_type: str = "audio/mpeg") -> LiveClip:
+        """Register a clip whose audio is still being synthesized"""
+        live = LiveClip(media_type)
+        self._live[clip_id] = live
+        return live
+
+    def get_live(self, clip_id: str) -> Optional[LiveClip]:
+        """Return the live clip for an id while it is being synthesized"""
+        return self._live.get(clip_id)
+
+    def close_live(self, clip_id: str, data: Optional[bytes]):
+        """Store the finished audio of a live clip and release its readers"""
+        live = self._live.pop(clip_id, None)
+        if live is None:
+            # Deleted while it was being synthesized
+            return
+        if data:
+            self.put(data, clip_id=clip_id)
+        live.finish()
+
+    def expire_in(self, clip_id: str, seconds: float):
+        """Shorten (or extend) the lifetime of a clip"""
+        with self._lock:
+            clip = self._clips.get(clip_id)
+            if clip is not None:
+                clip.expires_at = time.monotonic() + seconds
+                heapq.heappush(self._expiry_heap, (clip.expires_at, clip_id))
+
+    def delete(self, clip_id: str):
+        """Remove a clip immediately"""
+        live = self._live.pop(clip_id, None)
+        if live is not None:
+            live.finish()
+        with self._lock:
+            self._remove(clip_id)
+
+    def discard(self, clip_ids: Iterable[str]):
+        """Remove clips without the caller waiting on it"""
+        for clip_id in list(clip_ids):
+            self.delete(clip_id)
+
+    async def call(self, fn: Callable, *args):
+        """Run a store method from the event loop; in memory it never blocks"""
+        return fn(*args)
+
+    def __len__(self) -> int:
+        return len(self._clips)
+
+    def _remove(self, clip_id: str):
+        clip = self._clips.pop(clip_id, None)
+        if clip is not None:
+            self.total_bytes -= len(clip.data)
+
+    def purge_expired(self) -> int:
+        """Remove every clip whose TTL has passed, returning how many"""
+        now = time.monotonic()
+        purged = 0
+        with self._lock:
+            while self._expiry_heap and self._expiry_heap[0][0] <= now:
+                expires_at, clip_id = heapq.heappop(self._expiry_heap)
+                clip = self._clips.get(clip_id)
+                # Skip entries superseded by expire_in() or a re-put
+                if clip is not None and clip.expires_at == expires_at:
+                    self._remove(clip_id)
+                    purged += 1
+            # Drop stale entries left behind by deletes and evictions
+            if len(self._expiry_heap) > 2 * len(self._clips) + 64:
+                self._expiry_heap = [
+                    (clip.expires_at, cid) for cid, clip in self._clips.items()
+                ]
+                heapq.heapify(self._expiry_heap)
+        return purged
+
+    async def run_janitor(self, interval: float = JANITOR_INTERVAL_SECONDS):
+        """Background task that purges expired clips"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.purge_expired()
+            except Exception as e:
+                print(f"Clip store janitor error: {e}")
+
+
+def connect_state_db(path: str = STATE_DB_PATH) -> sqlite3.Connection:
+    """Open a connection to the shared state database"""
+    # Connections may be opened at import time and then used on the event loop
+    connection = sqlite3.connect(
+        path, timeout=5.0, isolation_level=None, check_same_thread=False
+    )
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+class SharedLiveClip(LiveClip):
+    """A live clip whose chunks are also published to the shared database"""
+
+    def __init__(self, store: "SQLiteClipStore", clip_id: str, media_type: str):
+        super().__init__(media_type)
+        self._store = store
+        self._clip_id = clip_id
+        self._seq = 0
+        # Set once the clip's live row is dropped; chunks published after
+        # that would never be cleaned up with it
+        self.closed = False
+
+    def feed(self, chunk: bytes):
+        if self.closed:
+            return
+        super().feed(chunk)
+        self._store._append_chunk(self._clip_id, self._seq, chunk)
+        self._seq += 1
+
+
+class PolledLiveClip:
+    """Reader for a clip being synthesized by another worker"""
+
+    def __init__(self, store: "SQLiteClipStore", clip_id: str, media_type: str):
+        self.media_type = media_type
+        self._store = store
+        self._clip_id = clip_id
+
+    async def wait_finished(self):
+        while await self._store.call(self._store._is_live, self._clip_id):
+            await asyncio.sleep(LIVE_POLL_SECONDS)
+
+    async def iter_chunks(self) -> AsyncIterator[bytes]:
+        """Yield published chunks until the clip is complete"""
+        seq = 0
+        sent = 0
+        while True:
+            live = await self._store.call(self._store._is_live, self._clip_id)
+            chunks = await self._store.call(self._store._chunks_since, self._clip_id, seq)
+            for chunk in chunks:
+                seq += 1
+                sent += len(chunk)
+                yield chunk
+            if not live:
+                # Chunks are dropped once the clip is stored; send the rest
+                clip = await self._store.call(self._store.get, self._clip_id)
+                if clip is not None and len(clip.data) > sent:
+                    yield clip.data[sent:]
+                return
+            await asyncio.sleep(LIVE_POLL_SECONDS)
+
+
+class SQLiteClipStore:
+    """Clip store shared by all workers on a node through SQLite
+
+    Same interface as ClipStore, so an /clips fetch can be served by any
+    worker. Clips being synthesized publish their chunks to the database,
+    letting other workers stream them too. Queries made from the event loop
+    go through call() or run in the background on a writer thread, so the
+    loop never waits on the database.
+    """
+
+    def __init__(
+        self,
+        path: str = STATE_DB_PATH,
+        max_bytes: int = CLIP_STORE_MAX_BYTES,
+        ttl_seconds: float = CLIP_TTL_SECONDS,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._live: Dict[str, SharedLiveClip] = {}
+        # Node-wide totals, refreshed off the event loop by put and the janitor
+        self._count = 0
+        self._total_bytes = 0
+        # One thread keeps writes from the event loop in submission order
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="clip-store")
+
+        db = self._db()
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS clips (id TEXT PRIMARY KEY, data BLOB,"
+            " media_type TEXT, duration REAL, size INTEGER, created_at REAL,"
+            " expires_at REAL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS clips_expiry ON clips (expires_at)")
+        db.execute("CREATE INDEX IF NOT EXISTS clips_created ON clips (created_at)")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS live_clips (id TEXT PRIMARY KEY,"
+            " media_type TEXT, created_at REAL)"
+        )
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS live_chunks (id TEXT, seq INTEGER,"
+            " data BLOB, PRIMARY KEY (id, seq))"
+        )
+
+    def _db(self) -> sqlite3.Connection:
+        # One connection per thread: TTS threads publish chunks concurrently
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = connect_state_db(self.path)
+            self._local.connection = connection
+        return connection
+
+    @property
+    def total_bytes(self) -> int:
+        """Stored audio bytes as of the last put or janitor pass"""
+        return self._total_bytes
+
+    async def call(self, fn: Callable, *args):
+        """Run a blocking store method on the writer thread"""
+        return await asyncio.get_running_loop().run_in_executor(self._writer, fn, *args)
+
+    def new_id(self) -> str:
+        """Allocate a unique clip id"""
+        return uuid.uuid4().hex
+
+    def put(
+        self, data: bytes, media_type: str = "audio/mpeg", clip_id: Optional[str] = None
+    ) -> str:
+        """Store a clip and return its id"""
+        clip_id = clip_id or self.new_id()
+        now = time.time()
+        duration = audio_duration(data, media_type)
+        db = self._db()
+        db.execute(
+            "INSERT OR REPLACE INTO clips VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (clip_id, data, media_type, duration, len(data), now, now + self.ttl_seconds),
+        )
+
+        # Evict the oldest clips once over the byte cap
+        total = self._refresh_totals()
+        if total > self.max_bytes:
+            for old_id, size in db.execute(
+                "SELECT id, size FROM clips WHERE id != ? ORDER BY created_at",
+                (clip_id,),
+            ).fetchall():
+                db.execute("DELETE FROM clips WHERE id = ?", (old_id,))
+                total -= size
+                self._count -= 1
+                if total <= self.max_bytes:
+                    break
+            self._total_bytes = total
+        return clip_id
+
+    def get(self, clip_id: str) -> Optional[Clip]:
+        """Return a clip if it exists and has not expired"""
+        row = (
+            self._db()
+            .execute(
+                "SELECT data, media_type, duration, expires_at FROM clips"
+                " WHERE id = ? AND expires_at > ?",
+                (clip_id, time.time()),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        return Clip(row[0], row[1], row[3], duration=row[2])
+
+    def open_live(self, clip_id: str, media_type: str = "audio/mpeg") -> LiveClip:
+        """Register a clip whose audio is still being synthesized
+
+        Readers on this worker find it right away; its row for the other
+        workers is written in the background, ahead of any later write.
+        """
+        live = SharedLiveClip(self, clip_id, media_type)
+        self._live[clip_id] = live
+        self._writer.submit(self._insert_live, clip_id, media_type)
+        return live
+
+    def get_live(self, clip_id: str):
+        """Return a reader for a clip while it is being synthesized"""
+        live = self._live.get(clip_id)
+        if live is not None:
+            return live
+        row = (
+            self._db()
+            .execute("SELECT media_type FROM live_clips WHERE id = ?", (clip_id,))
+            .fetchone()
+        )
+        return PolledLiveClip(self, clip_id, row[0]) if row else None
+
+    def close_live(self, clip_id: str, data: Optional[bytes]):
+        """Store the finished audio of a live clip and release its readers"""
+        live = self._pop_live(clip_id)
+        if live is None:
+            # Deleted while it was being synthesized
+            return
+        if data:
+            self.put(data, clip_id=clip_id)
+        self._drop_live(clip_id)
+        live.finish()
+
+    def expire_in(self, clip_id: str, seconds: float):
+        """Shorten (or extend) the lifetime of a clip, in the background"""
+        self._writer.submit(self._set_expiry, clip_id, time.time() + seconds)
+
+    def delete(self, clip_id: str):
+        """Remove a clip immediately"""
+        live = self._pop_live(clip_id)
+        if live is not None:
+            live.finish()
+        self._delete_rows([clip_id])
+
+    def discard(self, clip_ids: Iterable[str]):
+        """Remove clips in the background, without the caller waiting on it"""
+        clip_ids = list(clip_ids)
+        for clip_id in clip_ids:
+            live = self._pop_live(clip_id)
+            if live is not None:
+                live.finish()
+        self._writer.submit(self._delete_rows, clip_ids)
+
+    def purge_expired(self) -> int:
+        """Remove every clip whose TTL has passed, returning how many"""
+        db = self._db()
+        cursor = db.execute("DELETE FROM clips WHERE expires_at <= ?", (time.time(),))
+        # Live entries left behind by a worker that died mid-synthesis
+        stale = time.time() - self.ttl_seconds
+        for (clip_id,) in db.execute(
+            "SELECT id FROM live_clips WHERE created_at < ?", (stale,)
+        ).fetchall():
+            self._drop_live(clip_id)
+        # Chunks a synthesizer published just as its live row was dropped
+        db.execute(
+            "DELETE FROM live_chunks WHERE id NOT IN (SELECT id FROM live_clips)"
+        )
+        self._refresh_totals()
+        return cursor.rowcount
+
+    async def run_janitor(self, interval: float = JANITOR_INTERVAL_SECONDS):
+        """Background task that purges expired clips"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.call(self.purge_expired)
+            except Exception as e:
+                print(f"Clip store janitor error: {e}")
+
+    def __len__(self) -> int:
+        """Stored clips as of the last put or janitor pass"""
+        return self._count
+
+    def _refresh_totals(self) -> int:
+        self._count, self._total_bytes = (
+            self._db()
+            .execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM clips")
+            .fetchone()
+        )
+        return self._total_bytes
+
+    def _pop_live(self, clip_id: str) -> Optional[SharedLiveClip]:
+        live = self._live.pop(clip_id, None)
+        if live is not None:
+            live.closed = True
+        return live
+
+    def _insert_live(self, clip_id: str, media_type: str):
+        try:
+            self._db().execute(
+                "INSERT OR REPLACE INTO live_clips VALUES (?, ?, ?)",
+                (clip_id, media_type, time.time()),
+            )
+        except sqlite3.Error as e:
+            print(f"Could not publish live clip: {e}")
+
+    def _set_expiry(self, clip_id: str, expires_at: float):
+        try:
+            self._db().execute(
+                "UPDATE clips SET expires_at = ? WHERE id = ?", (expires_at, clip_id)
+            )
+        except sqlite3.Error as e:
+            print(f"Could not update clip expiry: {e}")
+
+    def _delete_rows(self, clip_ids: List[str]):
+        try:
+            for clip_id in clip_ids:
+                self._drop_live(clip_id)
+            self._db().executemany(
+                "DELETE FROM clips WHERE id = ?", [(clip_id,) for clip_id in clip_ids]
+            )
+        except sqlite3.Error as e:
+            print(f"Could not delete clips: {e}")
+
+    def _append_chunk(self, clip_id: str, seq: int, chunk: bytes):
+        try:
+            self._db().execute(
+                "INSERT OR REPLACE INTO live_chunks VALUES (?, ?, ?)",
+                (clip_id, seq, chunk),
+            )
+        except sqlite3.Error as e:
+            print(f"Could not publish audio chunk: {e}")
+
+    def _chunks_since(self, clip_id: str, seq: int) -> List[bytes]:
+        rows = (
+            self._db()
+            .execute(
+                "SELECT data FROM live_chunks WHERE id = ? AND seq >= ? ORDER BY seq",
+                (clip_id, seq),
+            )
+            .fetchall()
+        )
+        return [row[0] for row in rows]
+
+    def _is_live(self, clip_id: str) -> bool:
+        row = (
+            self._db()
+            .execute("SELECT 1 FROM live_clips WHERE id = ?", (clip_id,))
+            .fetchone()
+        )
+        return row is not None
+
+    def _drop_live(self, clip_id: str):
+        db = self._db()
+        db.execute("DELETE FROM live_clips WHERE id = ?", (clip_id,))
+        db.execute("DELETE FROM live_chunks WHERE id = ?", (clip_id,))
+
+
+def create_clip_store(backend: str = STATE_BACKEND):
+    """Build the clip store for the configured backend"""
+    if backend == "sqlite":
+        return SQLiteClipStore()
+    return ClipStore()
+
+
+# Create global instance
+clip_store = create_clip_store()
@@ -3,28 +3,148 @@ import azure.cognitiveservices.speech as speechsdk
 import threading
 import time
 import asyncio
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from tts_cache import TTSCache, cache_key
+import metrics
 
+# Size of the dedicated TTS thread pool and of the idle synthesizer pool
+TTS_MAX_WORKERS = int(os.getenv("TTS_MAX_WORKERS", "16"))
+TTS_MAX_IDLE_PER_VOICE = int(os.getenv("TTS_MAX_IDLE_PER_VOICE", "4"))
 
-class AzureTTSHelper:
-    def __init__(self):
-        self.key = os.getenv("SPEECHKEY")
-        self.endpoint = os.getenv("SPEECHENDPOINT")
+# OPTIMIZATION: Use compressed MP3 format for faster network transfer
+OUTPUT_FORMAT = speechsdk.SpeechSynthesisOutputFormat.Audio24Khz48KBitRateMonoMp3
 
-        if not self.key or not self.endpoint:
-            raise ValueError(
-                "SPEECHKEY and SPEECHENDPOINT environment variables must be set"
-            )
+# Cancellation details that mean the service is throttling us
+_THROTTLE_MARKERS = ("429", "too many requests", "throttl")
+
+
+class TTSThrottledError(Exception):
+    """Raised when Azure TTS rejects a synthesis because of rate limits"""
+
+    throttled = True
+    retry_after: Optional[float] = None
 
-        # Configure speech service
-        self.speech_config = speechsdk.SpeechConfig(
-            subscription=self.key, endpoint=self.endpoint
-        )
 
-        # OPTIMIZATION: Use compressed MP3 format for faster network transfer
-        self.speech_config.set_speech_synthesis_output_format(
-            speechsdk.SpeechSynthesisOutputFormat.Audio24Khz48KBitRateMonoMp3
+class CountingExecutor(ThreadPoolExecutor):
+    """Thread pool that counts jobs submitted and not yet finished"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.in_flight = 0
+        self._count_lock = threading.Lock()
+
+    def submit(self, fn, /, *args, **kwargs):
+        with self._count_lock:
+            self.in_flight += 1
+        try:
+            future = super().submit(fn, *args, **kwargs)
+        except BaseException:
+            self._finished(None)
+            raise
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, _future):
+        with self._count_lock:
+            self.in_flight -= 1
+
+
+class SynthesizerPool:
+    """Pre-connected SpeechSynthesizers per voice, used by one request at a time
+
+    Each voice gets its own SpeechConfig, so concurrent requests never change
+    a shared voice setting. Synthesizers are checked out under a lock and
+    returned after use, keeping their service connection open for the next
+    request.
+    """
+
+    def __init__(
+        self,
+        make_config: Callable[[str], speechsdk.SpeechConfig],
+        max_idle_per_voice: int = TTS_MAX_IDLE_PER_VOICE,
+    ):
+        self.make_config = make_config
+        self.max_idle_per_voice = max_idle_per_voice
+        self._configs: Dict[str, speechsdk.SpeechConfig] = {}
+        self._idle: Dict[str, List[Tuple[speechsdk.SpeechSynthesizer, object]]] = {}
+        self._lock = threading.Lock()
+
+    def config_for(self, voice_name: str) -> speechsdk.SpeechConfig:
+        """Return the (shared, never mutated) config for a voice"""
+        with self._lock:
+            config = self._configs.get(voice_name)
+            if config is None:
+                config = self.make_config(voice_name)
+                self._configs[voice_name] = config
+            return config
+
+    def _create(self, voice_name: str):
+        synthesizer = speechsdk.SpeechSynthesizer(
+            speech_config=self.config_for(voice_name), audio_config=None
         )
+        connection = None
+        try:
+            # OPTIMIZATION: Pre-connect to avoid connection setup latency
+            connection = speechsdk.Connection.from_speech_synthesizer(synthesizer)
+            connection.open(True)
+        except Exception as e:
+            print(f"Warning: Could not pre-connect to Azure TTS: {e}")
+        return synthesizer, connection
+
+    def acquire(self, voice_name: str):
+        """Check out an idle synthesizer for a voice, creating one if needed"""
+        with self._lock:
+            idle = self._idle.get(voice_name)
+            if idle:
+                return idle.pop()
+        return self._create(voice_name)
+
+    def release(self, voice_name: str, entry, healthy: bool = True):
+        """Return a synthesizer to the pool, dropping it if it failed"""
+        if healthy:
+            with self._lock:
+                idle = self._idle.setdefault(voice_name, [])
+                if len(idle) < self.max_idle_per_voice:
+                    idle.append(entry)
+                    return
+        self._close_entry(entry)
+
+    def prewarm(self, voice_names: List[str]) -> bool:
+        """Open one connected synthesizer per voice ahead of the first request,
+        returning whether every connection opened"""
+        connected = True
+        for voice_name in voice_names:
+            entry = self._create(voice_name)
+            connected = connected and entry[1] is not None
+            self.release(voice_name, entry)
+        return connected
+
+    def close(self):
+        """Close every idle synthesizer connection"""
+        with self._lock:
+            entries = [entry for idle in self._idle.values() for entry in idle]
+            self._idle.clear()
+        for entry in entries:
+            self._close_entry(entry)
+
+    def _close_entry(self, entry):
+        _, connection = entry
+        try:
+            if connection:
+                connection.close()
+        except Exception as e:
+            print(f"Error closing Azure TTS connection: {e}")
+
+
+class AzureTTSHelper:
+    """Azure TTS client; nothing touches the service until warm_up() or the
+    first synthesis, so importing this module needs no credentials"""
+
+    def __init__(self):
+        # Read on first use, after the app has loaded its .env file
+        self.key: Optional[str] = None
+        self.endpoint: Optional[str] = None
 
         # Voice mappings - maps display keys to Azure voice names
         self.voice_mappings = {
@@ -70,142 +190,240 @@ class AzureTTSHelper:
 
         self.stop_requested = False
 
-        # OPTIMIZATION: Create reusable synthesizer instance and pre-connect
-        self.speech_synthesizer = None
-        self.connection = None
-        self._initialize_synthesizer()
+        # OPTIMIZATION: Dedicated, bounded thread pool for blocking SDK calls
+        # so TTS never competes with (or starves) the default executor
+        self.executor = CountingExecutor(
+            max_workers=TTS_MAX_WORKERS, thread_name_prefix="azure-tts"
+        )
 
-        print("Azure TTS initialized with voices:", list(self.voice_mappings.keys()))
-        print("Using MP3 compression for optimal performance")
+        # OPTIMIZATION: Reusable, pre-connected synthesizers per voice
+        self.pool = SynthesizerPool(self._make_config)
 
-    def _initialize_synthesizer(self):
-        """Initialize and pre-connect the speech synthesizer for lower latency"""
-        try:
-            # Create synthesizer without audio config (we'll specify per request)
-            self.speech_synthesizer = speechsdk.SpeechSynthesizer(
-                speech_config=self.speech_config, audio_config=None
-            )
+        # OPTIMIZATION: Content-addressed cache of synthesized audio
+        self.cache = TTSCache()
 
-            # OPTIMIZATION: Pre-connect to avoid connection setup latency
-            self.connection = speechsdk.Connection.from_speech_synthesizer(
-                self.speech_synthesizer
+    def _load_credentials(self):
+        """Read the Speech credentials, raising if they are not configured"""
+        if self.key and self.endpoint:
+            return
+        self.key = os.getenv("SPEECHKEY")
+        self.endpoint = os.getenv("SPEECHENDPOINT")
+        if not self.key or not self.endpoint:
+            raise ValueError(
+                "SPEECHKEY and SPEECHENDPOINT environment variables must be set"
             )
-            self.connection.open(True)  # Pre-connect
-            print("Azure TTS: Pre-connected to service for optimal latency")
 
+    def warm_up(self) -> bool:
+        """Pre-connect the default voices, returning whether they connected
+
+        Blocks on the network, so run it in an executor. Raises ValueError
+        if the credentials are missing.
+        """
+        self._load_credentials()
+        connected = self._initialize_synthesizer()
+        print("Azure TTS initialized with voices:", list(self.voice_mappings.keys()))
+        print("Using MP3 compression for optimal performance")
+        return connected
+
+    def _make_config(self, voice_name: str) -> speechsdk.SpeechConfig:
+        """Create a SpeechConfig bound to a single voice"""
+        self._load_credentials()
+        config = speechsdk.SpeechConfig(subscription=self.key, endpoint=self.endpoint)
+        config.set_speech_synthesis_output_format(OUTPUT_FORMAT)
+        config.speech_synthesis_voice_name = voice_name
+        return config
+
+    def _initialize_synthesizer(self) -> bool:
+        """Pre-connect synthesizers for the default voices for lower latency"""
+        try:
+            connected = self.pool.prewarm(
+                [self.voice_mappings["entity1"], self.voice_mappings["entity2"]]
+            )
+            if connected:
+                print("Azure TTS: Pre-connected to service for optimal latency")
+            return connected
         except Exception as e:
             print(f"Warning: Could not pre-connect to Azure TTS: {e}")
-            # Fallback: create synthesizer without pre-connection
-            self.speech_synthesizer = speechsdk.SpeechSynthesizer(
-                speech_config=self.speech_config, audio_config=None
-            )
+            return False
 
     def get_voice_name(self, voice_key: str) -> str:
         """Get Azure voice name from voice key"""
         return self.voice_mappings.get(voice_key, self.voice_mappings["entity1"])
 
-    def generate_audio_file(
-        self, text: str, voice_key: str, speed: float = 1.0
-    ) -> Optional[str]:
-        """Generate audio file using Azure TTS and return file path"""
-        try:
-            # Clean text and prepare for synthesis
-            cleaned_text = text.strip()
-            if not cleaned_text:
-                return None
-
-            # Get the Azure voice name
-            voice_name = self.get_voice_name(voice_key)
+    def _prepare_request(self, text: str, voice_key: str, speed: float):
+        """Return (voice_name, ssml) for a request, ssml is None at normal speed"""
+        # Get the Azure voice name
+        voice_name = self.get_voice_name(voice_key)
 
-            # Create unique filename - using .mp3 extension now for compressed format
-            timestamp = int(time.time() * 1000)  # Use milliseconds for uniqueness
-            audio_file = os.path.join(
-                self.audio_dir, f"azure_{voice_key}_{timestamp}.mp3"
-            )
-
-            # Configure audio output to file
-            audio_config = speechsdk.audio.AudioOutputConfig(filename=audio_file)
-
-            # Configure speech settings for this request
-            self.speech_config.speech_synthesis_voice_name = voice_name
+        # Adjust speech rate based on speed parameter
+        # speed 1.0 = normal, 0.5 = slow, 2.0 = fast
+        rate_percent = int((speed - 1.0) * 100)
+        if rate_percent == 0:
+            return voice_name, None
 
-            # Adjust speech rate based on speed parameter
-            # speed 1.0 = normal, 0.5 = slow, 2.0 = fast
-            rate_percent = int((speed - 1.0) * 100)
-            if rate_percent != 0:
-                rate_string = (
-                    f"+{rate_percent}%" if rate_percent > 0 else f"{rate_percent}%"
-                )
-                ssml_text = f"""
+        rate_string = f"+{rate_percent}%" if rate_percent > 0 else f"{rate_percent}%"
+        ssml_text = f"""
                 <speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" xml:lang="en-US">
                     <voice name="{voice_name}">
                         <prosody rate="{rate_string}">
-                            {cleaned_text}
+                            {text}
                         </prosody>
                     </voice>
                 </speak>
                 """
-            else:
-                ssml_text = cleaned_text
+        return voice_name, ssml_text
 
-            # OPTIMIZATION: Use the reusable synthesizer with new audio config
-            # Create a new synthesizer with the specific audio config for this request
-            request_synthesizer = speechsdk.SpeechSynthesizer(
-                speech_config=self.speech_config, audio_config=audio_config
-            )
+    def _speak(self, synthesizer, text: str, ssml_text: Optional[str]):
+        """Run synthesis and log latency metrics"""
+        # Record start time for latency measurement
+        start_time = time.time()
 
-            # Record start time for latency measurement
-            start_time = time.time()
+        # Synthesize speech
+        if ssml_text:
+            result = synthesizer.speak_ssml_async(ssml_text).get()
+        else:
+            result = synthesizer.speak_text_async(text).get()
 
-            # Synthesize speech
-            if rate_percent != 0:
-                result = request_synthesizer.speak_ssml_async(ssml_text).get()
-            else:
-                result = request_synthesizer.speak_text_async(cleaned_text).get()
+        # Calculate and log latency metrics
+        total_time = (time.time() - start_time) * 1000  # Convert to milliseconds
 
-            # Calculate and log latency metrics
-            total_time = (time.time() - start_time) * 1000  # Convert to milliseconds
+        # Extract Azure latency metrics if available
+        try:
+            first_byte_latency = result.properties.get_property(
+                speechsdk.PropertyId.SpeechServiceResponse_SynthesisFirstByteLatencyMs
+            )
+            finish_latency = result.properties.get_property(
+                speechsdk.PropertyId.SpeechServiceResponse_SynthesisFinishLatencyMs
+            )
+            network_latency = result.properties.get_property(
+                speechsdk.PropertyId.SpeechServiceResponse_SynthesisNetworkLatencyMs
+            )
+            service_latency = result.properties.get_property(
+                speechsdk.PropertyId.SpeechServiceResponse_SynthesisServiceLatencyMs
+            )
 
-            # Extract Azure latency metrics if available
-            try:
-                first_byte_latency = result.properties.get_property(
-                    speechsdk.PropertyId.SpeechServiceResponse_SynthesisFirstByteLatencyMs
-                )
-                finish_latency = result.properties.get_property(
-                    speechsdk.PropertyId.SpeechServiceResponse_SynthesisFinishLatencyMs
-                )
-                network_latency = result.properties.get_property(
-                    speechsdk.PropertyId.SpeechServiceResponse_SynthesisNetworkLatencyMs
-                )
-                service_latency = result.properties.get_property(
-                    speechsdk.PropertyId.SpeechServiceResponse_SynthesisServiceLatencyMs
+            first_byte = metrics.optional_float(first_byte_latency)
+            finish = metrics.optional_float(finish_latency)
+            if first_byte is not None:
+                metrics.tts_latency.observe(first_byte / 1000, phase="first_byte")
+            if finish is not None:
+                metrics.tts_latency.observe(finish / 1000, phase="finish")
+
+            if first_byte_latency:
+                print(
+                    f"Azure TTS Latency - First byte: {first_byte_latency}ms, "
+                    f"Finish: {finish_latency}ms, Network: {network_latency}ms, "
+                    f"Service: {service_latency}ms, Total: {total_time:.1f}ms"
                 )
+        except:
+            print(f"Azure TTS: Total synthesis time: {total_time:.1f}ms")
+
+        return result
+
+    def _check_result(self, result) -> bool:
+        """Return True if synthesis completed, logging the reason otherwise"""
+        if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
+            return True
+        elif result.reason == speechsdk.ResultReason.Canceled:
+            cancellation_details = result.cancellation_details
+            print(f"Azure TTS synthesis canceled: {cancellation_details.reason}")
+            metrics.errors.inc(stage="tts")
+            if cancellation_details.reason == speechsdk.CancellationReason.Error:
+                details = cancellation_details.error_details or ""
+                print(f"Error details: {details}")
+                if any(marker in details.lower() for marker in _THROTTLE_MARKERS):
+                    raise TTSThrottledError(details)
+            return False
+        else:
+            print(f"Azure TTS synthesis failed with reason: {result.reason}")
+            metrics.errors.inc(stage="tts")
+            return False
 
-                if first_byte_latency:
-                    print(
-                        f"Azure TTS Latency - First byte: {first_byte_latency}ms, "
-                        f"Finish: {finish_latency}ms, Network: {network_latency}ms, "
-                        f"Service: {service_latency}ms, Total: {total_time:.1f}ms"
-                    )
-            except:
-                print(f"Azure TTS: Total synthesis time: {total_time:.1f}ms")
-
-            # Check if synthesis was successful
-            if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
-                print(f"Azure TTS: MP3 audio saved to {audio_file}")
-                return audio_file
-            elif result.reason == speechsdk.ResultReason.Canceled:
-                cancellation_details = result.cancellation_details
-                print(f"Azure TTS synthesis canceled: {cancellation_details.reason}")
-                if cancellation_details.reason == speechsdk.CancellationReason.Error:
-                    print(f"Error details: {cancellation_details.error_details}")
-                return None
-            else:
-                print(f"Azure TTS synthesis failed with reason: {result.reason}")
+    def generate_audio_file(
+        self, text: str, voice_key: str, speed: float = 1.0
+    ) -> Optional[str]:
+        """Generate audio file using Azure TTS and return file path"""
+        try:
+            audio = self.synthesize_audio(text, voice_key, speed)
+        except TTSThrottledError as e:
+            print(f"Azure TTS throttled: {e}")
+            return None
+        if not audio:
+            return None
+
+        # Create unique filename - using .mp3 extension now for compressed format
+        timestamp = int(time.time() * 1000)  # Use milliseconds for uniqueness
+        audio_file = os.path.join(self.audio_dir, f"azure_{voice_key}_{timestamp}.mp3")
+        try:
+            with open(audio_file, "wb") as f:
+                f.write(audio)
+        except Exception as e:
+            print(f"Error generating Azure TTS audio: {e}")
+            return None
+
+        print(f"Azure TTS: MP3 audio saved to {audio_file}")
+        return audio_file
+
+    def synthesize_audio(
+        self,
+        text: str,
+        voice_key: str,
+        speed: float = 1.0,
+        on_chunk: Optional[Callable[[bytes], None]] = None,
+    ) -> Optional[bytes]:
+        """Synthesize speech with Azure TTS and return the MP3 bytes
+
+        Nothing is written to disk: without an audio output config the SDK
+        keeps the synthesized stream in memory on the result. If on_chunk is
+        given it receives each audio chunk as the service produces it.
+        Raises TTSThrottledError when the service is rate limiting, so the
+        caller can back off and retry.
+        """
+        try:
+            # Clean text and prepare for synthesis
+            cleaned_text = text.strip()
+            if not cleaned_text:
                 return None
 
+            voice_name, ssml_text = self._prepare_request(cleaned_text, voice_key, speed)
+
+            # OPTIMIZATION: Repeated utterances come straight from the cache
+            key = cache_key(
+                voice_name, int((speed - 1.0) * 100), OUTPUT_FORMAT.name, cleaned_text
+            )
+            cached = self.cache.get(key)
+            metrics.tts_cache_lookups.inc(result="miss" if cached is None else "hit")
+            if cached is not None:
+                if on_chunk is not None:
+                    on_chunk(cached)
+                return cached
+
+            # OPTIMIZATION: Check out a pre-connected synthesizer for the voice
+            entry = self.pool.acquire(voice_name)
+            synthesizer = entry[0]
+            healthy = False
+            try:
+                if on_chunk is not None:
+                    synthesizer.synthesizing.connect(
+                        lambda evt: on_chunk(evt.result.audio_data)
+                    )
+                result = self._speak(synthesizer, cleaned_text, ssml_text)
+                healthy = self._check_result(result)
+            finally:
+                if on_chunk is not None:
+                    synthesizer.synthesizing.disconnect_all()
+                self.pool.release(voice_name, entry, healthy)
+
+            if healthy:
+                self.cache.put(key, result.audio_data)
+                return result.audio_data
+            return None
+
+        except TTSThrottledError:
+            raise
         except Exception as e:
             print(f"Error generating Azure TTS audio: {e}")
+            metrics.errors.inc(stage="tts")
             return None
 
     def stop_all_audio(self):
@@ -235,13 +453,10 @@ class AzureTTSHelper:
             print(f"Error cleaning up old audio files: {e}")
 
     def close_connection(self):
-        """Close the pre-established connection"""
-        try:
-            if self.connection:
-                self.connection.close()
-                print("Azure TTS: Connection closed")
-        except Exception as e:
-            print(f"Error closing Azure TTS connection: {e}")
+        """Close the pre-established connections"""
+        self.pool.close()
+        self.executor.shutdown(wait=False)
+        print("Azure TTS: Connection closed")
 
 
 # Create global instance
@@ -0,0 +1,299 @@
+"""Render conversations offline, without real-time playback.
+
+Each line of the scenarios file is a JSON object with the same settings as
+the websocket "start" message (system1, system2, voice1, speed1,
+temperature1, topP1, responseLength1, ... and the same for entity 2), plus
+an optional "id". Conversations run through the server's own turn logic,
+concurrently under a bounded worker pool; upstream quotas are shared
+through the LLM and TTS schedulers.
+
+    python batch.py scenarios.jsonl --out batch_output --workers 8
+
+Every turn is written as soon as it is produced:
+
+    batch_output/results.jsonl          one line per finished scenario
+    batch_output/<id>/transcript.jsonl  one line per turn
+    batch_output/<id>/turn_000.mp3      the turn's audio
+
+Rerunning the same command resumes: scenarios already recorded as "ok" in
+results.jsonl are skipped and unfinished ones start over.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import shutil
+import sys
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from app import MAX_PLAYBACK_BUFFER, run_conversation
+from audio_store import clip_store
+from sessions import Session
+
+# Conversations rendered at once
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "8"))
+
+RESULTS_FILE = "results.jsonl"
+TRANSCRIPT_FILE = "transcript.jsonl"
+
+# Settings that turn a websocket conversation into a headless one: sentences
+# are synthesized in parallel, every clip is complete before it is announced
+# and turns are pushed without waiting for playback
+HEADLESS_CONFIG = {
+    "type": "start",
+    "stream": True,
+    "streamAudio": False,
+    "protocol": 2,
+    "bufferTurns": MAX_PLAYBACK_BUFFER,
+}
+
+
+def scenario_id(scenario: Dict[str, Any], line_number: int) -> str:
+    """File-system safe id of a scenario, from its "id" or its line"""
+    raw = str(scenario.get("id") or f"scenario-{line_number:04d}")
+    return re.sub(r"[^A-Za-z0-9._-]", "_", raw)
+
+
+def load_scenarios(path: str) -> List[Dict[str, Any]]:
+    """Read scenarios from a JSONL file, giving each a unique id"""
+    scenarios = []
+    seen = set()
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            scenario = json.loads(line)
+            sid = scenario_id(scenario, line_number)
+            if sid in seen:
+                raise ValueError(f"Duplicate scenario id {sid!r} on line {line_number}")
+            seen.add(sid)
+            scenarios.append({**scenario, "id": sid})
+    return scenarios
+
+
+def completed_scenarios(output_dir: str) -> set:
+    """Ids of the scenarios a previous run finished"""
+    done = set()
+    try:
+        with open(os.path.join(output_dir, RESULTS_FILE), encoding="utf-8") as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    # A line cut short by a crash
+                    continue
+                if result.get("status") == "ok":
+                    done.add(result["id"])
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def _append_line(path: str, record: Dict[str, Any]):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _write_file(path: str, data: bytes):
+    """Write a file so a crash never leaves a partial one behind"""
+    temp = f"{path}.tmp"
+    with open(temp, "wb") as f:
+        f.write(data)
+    os.replace(temp, path)
+
+
+class TurnWriter:
+    """Stands in for the client's websocket and saves each turn to disk
+
+    Every sentence clip is complete by the time it is announced, so its
+    audio is collected straight from the clip store. Once a turn is handled
+    it is reported played at once, which lets the conversation go on
+    without any playback pacing. A turn that cannot be saved complete fails
+    the scenario and stops its conversation, since a rerun renders it again.
+    """
+
+    def __init__(self, directory: str, session: Session):
+        self.directory = directory
+        self.session = session
+        self.audio: List[bytes] = []
+        self.turns = 0
+        self.audio_seconds = 0.0
+        # Sentences of the current turn whose synthesis produced no audio
+        self.missing = 0
+        self.error: Optional[str] = None
+
+    async def send_text(self, data: str):
+        # run_conversation ignores send errors, so they are recorded here
+        message = json.loads(data)
+        kind = message.get("type")
+        try:
+            if kind == "speaking_start":
+                self.audio = []
+                self.missing = 0
+            elif kind == "speaking_chunk":
+                url = message.get("audioUrl")
+                clip = (
+                    await clip_store.call(clip_store.get, url.rsplit("/", 1)[-1])
+                    if url
+                    else None
+                )
+                if clip is not None and clip.data:
+                    self.audio.append(clip.data)
+                    self.audio_seconds += clip.duration or 0
+                else:
+                    self.missing += 1
+            elif kind == "speaking_end":
+                try:
+                    if self.missing:
+                        self.fail(
+                            f"Turn {message['turn']}: {self.missing} sentence(s)"
+                            " without audio"
+                        )
+                    await self._save_turn(message)
+                finally:
+                    self.session.report_played(message["turn"])
+            elif kind == "error":
+                self.fail(message.get("message") or "Conversation failed")
+        except Exception as e:
+            self.fail(f"Could not save {kind}: {e}")
+
+    def fail(self, error: str):
+        """Record the scenario's first error and stop its conversation"""
+        if self.error is None:
+            self.error = error
+        self.session.stop = True
+        self.session.audio_finished.set()
+
+    async def _save_turn(self, message: Dict[str, Any]):
+        filename = f"turn_{message['turn']:03d}.mp3" if self.audio else None
+        record = {
+            "turn": message["turn"],
+            "entity": message["entity"],
+            "text": message.get("text", ""),
+            "audio": filename,
+        }
+        audio = b"".join(self.audio)
+        self.audio = []
+
+        def write():
+            if filename:
+                _write_file(os.path.join(self.directory, filename), audio)
+            _append_line(os.path.join(self.directory, TRANSCRIPT_FILE), record)
+
+        # Keep file I/O off the event loop shared with other conversations
+        await asyncio.get_running_loop().run_in_executor(None, write)
+        self.turns += 1
+
+
+async def render_scenario(scenario: Dict[str, Any], output_dir: str) -> Dict[str, Any]:
+    """Run one conversation to completion and describe the outcome"""
+    directory = os.path.join(output_dir, scenario["id"])
+
+    def prepare():
+        # An unfinished earlier attempt starts over
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+
+    await asyncio.get_running_loop().run_in_executor(None, prepare)
+
+    session = Session(uuid.uuid4().hex)
+    writer = TurnWriter(directory, session)
+    config = {**scenario, **HEADLESS_CONFIG}
+    started = time.perf_counter()
+    try:
+        await run_conversation(writer, session, config)
+    except Exception as e:
+        writer.error = str(e)
+
+    result = {
+        "id": scenario["id"],
+        "status": "error" if writer.error or not writer.turns else "ok",
+        "turns": writer.turns,
+        "audio_seconds": round(writer.audio_seconds, 2),
+        "elapsed_seconds": round(time.perf_counter() - started, 2),
+    }
+    if result["status"] == "error":
+        result["error"] = writer.error or "No turns were generated"
+    return result
+
+
+async def run_batch(
+    scenarios: List[Dict[str, Any]],
+    output_dir: str,
+    workers: int = BATCH_WORKERS,
+) -> List[Dict[str, Any]]:
+    """Render every scenario not already finished in output_dir
+
+    Results are appended to results.jsonl as each scenario finishes and
+    returned in completion order.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    done = completed_scenarios(output_dir)
+    pending: asyncio.Queue = asyncio.Queue()
+    for scenario in scenarios:
+        if scenario["id"] not in done:
+            pending.put_nowait(scenario)
+    if pending.empty():
+        return []
+
+    skipped = len(scenarios) - pending.qsize()
+    if skipped:
+        print(f"Resuming: {skipped} of {len(scenarios)} scenarios already done")
+
+    results: List[Dict[str, Any]] = []
+    total = pending.qsize()
+    results_path = os.path.join(output_dir, RESULTS_FILE)
+
+    async def worker():
+        while not pending.empty():
+            scenario = pending.get_nowait()
+            result = await render_scenario(scenario, output_dir)
+            await asyncio.get_running_loop().run_in_executor(
+                None, _append_line, results_path, result
+            )
+            results.append(result)
+            print(
+                f"[{len(results)}/{total}] {result['id']}: {result['status']},"
+                f" {result['turns']} turns, {result['audio_seconds']}s of audio"
+                f" in {result['elapsed_seconds']}s"
+                + (f" ({result['error']})" if result["status"] == "error" else "")
+            )
+
+    await asyncio.gather(*(worker() for _ in range(max(1, min(workers, total)))))
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("scenarios", help="JSONL file with one conversation config per line")
+    parser.add_argument("--out", default="batch_output", help="output directory")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS,
+                        help="conversations rendered at once")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if not os.getenv("AZURE_OPENAI_KEY_DE_4_1") or not os.getenv("AZURE_OPENAI_ENDPOINT_DE_4_1"):
+        print("Azure OpenAI credentials not found")
+        return 1
+
+    scenarios = load_scenarios(args.scenarios)
+    started = time.perf_counter()
+    results = asyncio.run(run_batch(scenarios, args.out, args.workers))
+    failed = [result for result in results if result["status"] != "ok"]
+    print(
+        f"Rendered {len(results) - len(failed)} conversations"
+        f" in {time.perf_counter() - started:.1f}s, {len(failed)} failed"
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
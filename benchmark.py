@@ -0,0 +1,501 @@
+"""Load test and latency benchmark for the conversation server.
+
+Starts the app in a subprocess against local stand-ins for Azure OpenAI and
+Azure TTS, drives concurrent websocket clients through whole conversations
+(start, audio_finished acks, stop) and reports time-to-first-audio, the gap
+between turns, turn latency percentiles, event-loop lag and memory per
+session.
+
+    python benchmark.py --clients 20 --turns 6
+    python benchmark.py --clients 50 --json results.json --baseline last.json
+
+With --baseline the run exits non-zero if a tracked p95/p99 regressed by
+more than --tolerance, so it can gate a release.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+import httpx
+import uvicorn
+import websockets
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+from audio_metadata import mp3_duration
+
+# One MPEG-2 Layer III frame in the TTS output format (48 kbps, 24 kHz mono)
+MP3_FRAME = bytes([0xFF, 0xF3, 0x64, 0xC0]) + bytes(140)
+MP3_FRAME_SECONDS = 576 / 24000
+
+VOCABULARY = (
+    "well honestly think really point costs people market change idea policy "
+    "future money question interesting wait right sure maybe never always"
+).split()
+
+# Metrics compared against a baseline, as (section, statistic)
+GATED_METRICS = [
+    ("ttfa", "p95"),
+    ("inter_turn_gap", "p95"),
+    ("turn_latency", "p95"),
+    ("loop_lag", "p99"),
+]
+
+
+def jittered(latency: float, jitter: float) -> float:
+    return max(0.0, random.gauss(latency, jitter)) if jitter else latency
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of values, None when there are none"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = math.ceil(q / 100 * len(ordered))
+    return ordered[min(len(ordered), max(1, rank)) - 1]
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None,
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# --- Azure stand-ins (run inside the server process) ---
+
+
+def mock_reply(words: int) -> str:
+    """Random sentences, so neither cache can serve the benchmark"""
+    sentences = []
+    while words > 0:
+        count = min(words, random.randint(6, 14))
+        sentence = " ".join(random.choice(VOCABULARY) for _ in range(count))
+        sentences.append(sentence.capitalize() + random.choice([".", "?", "!"]))
+        words -= count
+    return " ".join(sentences)
+
+
+def create_mock_openai(args) -> FastAPI:
+    """OpenAI-compatible chat completions endpoint with simulated latency"""
+    mock = FastAPI()
+
+    @mock.post("/openai/deployments/{deployment}/chat/completions")
+    async def chat_completions(deployment: str, request: Request):
+        body = await request.json()
+        await asyncio.sleep(jittered(args.llm_latency, args.llm_jitter))
+        text = mock_reply(args.reply_words)
+        created = int(time.time())
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+        if not body.get("stream"):
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": deployment,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": text},
+                        "finish_reason": "stop",
+                    }
+                ],
+            }
+
+        async def events():
+            for word in text.split(" "):
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": deployment,
+                    "choices": [
+                        {"index": 0, "delta": {"content": word + " "}, "finish_reason": None}
+                    ],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(args.token_interval)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return mock
+
+
+def create_mock_synthesize(args):
+    """Drop-in for AzureTTSHelper.synthesize_audio with simulated latency
+
+    The Speech SDK talks its own websocket protocol, so the stand-in replaces
+    the helper call rather than the service. It still runs on the TTS
+    executor and streams chunks like the real synthesizer.
+    """
+
+    def synthesize_audio(text, voice_key, speed=1.0, on_chunk=None):
+        seconds = max(0.5, len(text.split()) / args.words_per_second / speed)
+        audio = MP3_FRAME * int(seconds / MP3_FRAME_SECONDS)
+        time.sleep(jittered(args.tts_latency, args.tts_jitter))
+        if on_chunk is not None:
+            step = max(len(MP3_FRAME), len(audio) // 4 // len(MP3_FRAME) * len(MP3_FRAME))
+            for start in range(0, len(audio), step):
+                on_chunk(audio[start : start + step])
+                time.sleep(args.tts_chunk_interval)
+        return audio
+
+    return synthesize_audio
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes up from short sleeps"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.samples: deque = deque(maxlen=100_000)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - started - self.interval))
+
+
+def serve(args):
+    """Run the app on args.port with Azure replaced by local stand-ins"""
+    os.environ.update(
+        AZURE_OPENAI_KEY_DE_4_1="benchmark",
+        AZURE_OPENAI_ENDPOINT_DE_4_1=f"http://127.0.0.1:{args.mock_port}",
+        SPEECHKEY="benchmark",
+        SPEECHENDPOINT="https://127.0.0.1:9",
+        PREWARM_TEMPLATES="0",
+        # The mock's small vocabulary would read as a repetitive conversation
+        REPETITION_DETECTION="0",
+    )
+
+    # The mock gets its own thread and loop so it does not load the app's loop
+    mock_server = uvicorn.Server(
+        uvicorn.Config(
+            create_mock_openai(args), host="127.0.0.1", port=args.mock_port, log_level="warning"
+        )
+    )
+    threading.Thread(target=mock_server.run, daemon=True).start()
+
+    import app as server
+
+    server.azure_tts.synthesize_audio = create_mock_synthesize(args)
+    monitor = LoopLagMonitor()
+
+    app_lifespan = server.app.router.lifespan_context
+
+    @asynccontextmanager
+    async def lifespan(app):
+        # Sample loop lag for as long as the app runs
+        task = asyncio.create_task(monitor.run())
+        try:
+            async with app_lifespan(app):
+                yield
+        finally:
+            task.cancel()
+
+    server.app.router.lifespan_context = lifespan
+
+    @server.app.get("/__benchmark__/stats")
+    async def benchmark_stats():
+        return {
+            "rss_bytes": rss_bytes(),
+            "sessions": len(server.sessions),
+            "loop_lag": list(monitor.samples),
+        }
+
+    uvicorn.run(server.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+# --- Load generator ---
+
+
+async def fetch_clip(http: httpx.AsyncClient, url: str):
+    """Download a clip, returning (time of first byte, finish time, bytes)"""
+    first_byte = None
+    body = bytearray()
+    async with http.stream("GET", url) as response:
+        async for chunk in response.aiter_bytes():
+            if first_byte is None:
+                first_byte = time.perf_counter()
+            body.extend(chunk)
+    now = time.perf_counter()
+    return first_byte or now, now, bytes(body)
+
+
+async def run_client(args, base_url: str, http: httpx.AsyncClient) -> Dict[str, Any]:
+    """One listener: start a conversation, play its turns, then stop"""
+    result: Dict[str, Any] = {"ttfa": None, "gaps": [], "turn_latencies": [], "error": None}
+    ws_url = base_url.replace("http", "ws", 1) + "/ws"
+    try:
+        async with websockets.connect(ws_url, ping_interval=None, max_size=None) as ws:
+            started = time.perf_counter()
+            await ws.send(
+                json.dumps(
+                    {
+                        "type": "start",
+                        "stream": True,
+                        "system1": "You argue that cities should ban cars downtown.",
+                        "system2": "You argue that cities should keep cars downtown.",
+                    }
+                )
+            )
+            last_ack = None
+            turn_started = started
+            fetches: List[asyncio.Task] = []
+            turns = 0
+            while turns < args.turns:
+                message = json.loads(await asyncio.wait_for(ws.recv(), args.timeout))
+                kind = message.get("type")
+                if kind == "speaking_start":
+                    turn_started = time.perf_counter()
+                    fetches = []
+                elif kind == "speaking_chunk" and message.get("audioUrl"):
+                    fetches.append(
+                        asyncio.create_task(fetch_clip(http, base_url + message["audioUrl"]))
+                    )
+                elif kind == "speaking_end":
+                    clips = await asyncio.gather(*fetches)
+                    if clips:
+                        first_audio = clips[0][0]
+                        if last_ack is None:
+                            result["ttfa"] = first_audio - started
+                        else:
+                            result["gaps"].append(first_audio - last_ack)
+                        result["turn_latencies"].append(
+                            max(clip[1] for clip in clips) - turn_started
+                        )
+                        duration = sum(mp3_duration(clip[2]) for clip in clips)
+                        await asyncio.sleep(duration * args.playback_scale)
+                    await ws.send(json.dumps({"type": "audio_finished"}))
+                    last_ack = time.perf_counter()
+                    turns += 1
+                elif kind == "ended":
+                    # The server finished the conversation early
+                    break
+                elif kind == "error":
+                    result["error"] = message.get("message")
+                    break
+            await ws.send(json.dumps({"type": "stop"}))
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
+
+async def sample_server(http: httpx.AsyncClient, base_url: str, peak: Dict[str, int], done: asyncio.Event):
+    while not done.is_set():
+        try:
+            stats = (await http.get(base_url + "/__benchmark__/stats")).json()
+            peak["rss_bytes"] = max(peak["rss_bytes"], stats["rss_bytes"])
+            peak["sessions"] = max(peak["sessions"], stats["sessions"])
+        except httpx.HTTPError:
+            pass
+        try:
+            await asyncio.wait_for(done.wait(), 0.5)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_benchmark(args, base_url: str) -> Dict[str, Any]:
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as http:
+        for _ in range(100):
+            try:
+                await http.get(base_url + "/api/")
+                break
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+        else:
+            raise RuntimeError("server did not start")
+
+        idle = (await http.get(base_url + "/__benchmark__/stats")).json()
+        peak = {"rss_bytes": idle["rss_bytes"], "sessions": 0}
+        done = asyncio.Event()
+        sampler = asyncio.create_task(sample_server(http, base_url, peak, done))
+
+        async def delayed_client(delay):
+            await asyncio.sleep(delay)
+            return await run_client(args, base_url, http)
+
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *(
+                delayed_client(args.ramp * i / max(1, args.clients))
+                for i in range(args.clients)
+            )
+        )
+        elapsed = time.perf_counter() - started
+        done.set()
+        await sampler
+        final = (await http.get(base_url + "/__benchmark__/stats")).json()
+
+    errors = [r["error"] for r in results if r["error"]]
+    sessions = max(1, peak["sessions"])
+    return {
+        "config": {
+            key: value for key, value in vars(args).items() if key not in ("serve", "json", "baseline")
+        },
+        "elapsed_seconds": elapsed,
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "ttfa": summarize([r["ttfa"] for r in results if r["ttfa"] is not None]),
+        "inter_turn_gap": summarize([g for r in results for g in r["gaps"]]),
+        "turn_latency": summarize([t for r in results for t in r["turn_latencies"]]),
+        "loop_lag": summarize(final["loop_lag"]),
+        "memory": {
+            "idle_rss_bytes": idle["rss_bytes"],
+            "peak_rss_bytes": peak["rss_bytes"],
+            "peak_sessions": peak["sessions"],
+            "bytes_per_session": (peak["rss_bytes"] - idle["rss_bytes"]) / sessions,
+        },
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    print(
+        f"\n{report['config']['clients']} clients x {report['config']['turns']} turns "
+        f"in {report['elapsed_seconds']:.1f}s, {report['errors']} errors"
+    )
+    for sample in report["error_samples"]:
+        print(f"  error: {sample}")
+    print(f"{'metric (ms)':<18}{'count':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    for section in ("ttfa", "inter_turn_gap", "turn_latency", "loop_lag"):
+        stats = report[section]
+        cells = [
+            f"{stats[key] * 1000:>10.1f}" if stats[key] is not None else f"{'-':>10}"
+            for key in ("p50", "p95", "p99", "max")
+        ]
+        print(f"{section:<18}{stats['count']:>8}{''.join(cells)}")
+    memory = report["memory"]
+    print(
+        f"memory: idle {memory['idle_rss_bytes'] / 2**20:.1f} MiB, "
+        f"peak {memory['peak_rss_bytes'] / 2**20:.1f} MiB with {memory['peak_sessions']} sessions, "
+        f"~{memory['bytes_per_session'] / 1024:.0f} KiB per session"
+    )
+
+
+def find_regressions(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Gated metrics that are worse than the baseline by more than tolerance"""
+    regressions = []
+    for section, statistic in GATED_METRICS:
+        current = report[section][statistic]
+        previous = baseline.get(section, {}).get(statistic)
+        if current is None or previous is None:
+            continue
+        # Ignore sub-millisecond noise on tiny values
+        if current > previous * (1 + tolerance) + 0.001:
+            regressions.append(
+                f"{section} {statistic}: {previous * 1000:.1f}ms -> {current * 1000:.1f}ms"
+            )
+    if report["errors"] > baseline.get("errors", 0):
+        regressions.append(f"errors: {baseline.get('errors', 0)} -> {report['errors']}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--clients", type=int, default=10, help="concurrent conversations")
+    parser.add_argument("--turns", type=int, default=6, help="turns each client listens to")
+    parser.add_argument("--ramp", type=float, default=2.0, help="seconds over which clients connect")
+    parser.add_argument("--playback-scale", type=float, default=1.0,
+                        help="fraction of real audio duration a client waits before acking")
+    parser.add_argument("--llm-latency", type=float, default=0.4, help="seconds to first token")
+    parser.add_argument("--llm-jitter", type=float, default=0.1)
+    parser.add_argument("--token-interval", type=float, default=0.01, help="seconds between tokens")
+    parser.add_argument("--reply-words", type=int, default=35)
+    parser.add_argument("--tts-latency", type=float, default=0.15, help="seconds to first audio chunk")
+    parser.add_argument("--tts-jitter", type=float, default=0.05)
+    parser.add_argument("--tts-chunk-interval", type=float, default=0.05)
+    parser.add_argument("--words-per-second", type=float, default=2.5, help="speaking rate of mock audio")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="report of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument("--verbose", action="store_true", help="show server output")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--mock-port", type=int, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.serve:
+        serve(args)
+        return 0
+
+    port, mock_port = free_port(), free_port()
+    command = [sys.executable, os.path.abspath(__file__), "--serve",
+               "--port", str(port), "--mock-port", str(mock_port)]
+    for name in ("llm_latency", "llm_jitter", "token_interval", "reply_words", "tts_latency",
+                 "tts_jitter", "tts_chunk_interval", "words_per_second"):
+        command += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+    output = None if args.verbose else subprocess.DEVNULL
+    server = subprocess.Popen(
+        command, cwd=os.path.dirname(os.path.abspath(__file__)), stdout=output, stderr=output
+    )
+    try:
+        report = asyncio.run(run_benchmark(args, f"http://127.0.0.1:{port}"))
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(report, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
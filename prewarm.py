@@ -0,0 +1,80 @@
+import asyncio
+import os
+from typing import Dict, Optional
+
+from azure_tts_helper import azure_tts
+from prompts import build_system_prompt, load_sample_conversations, opener_history
+from response_cache import response_cache, response_key
+from scheduler import llm_scheduler, tts_scheduler
+from sentence_chunker import split_sentences
+from transformers import estimate_tokens, gpt4o_mini_azure_history_async
+
+# Opt-in: prewarm the sample templates' opening lines at startup. It makes
+# paid LLM and TTS calls on every boot of every worker
+PREWARM_TEMPLATES = os.getenv("PREWARM_TEMPLATES", "0") == "1"
+
+# Settings a fresh page starts with (see index.html); only these are prewarmed
+DEFAULT_VOICE = "Christopher"
+DEFAULT_SPEED = 1.0
+DEFAULT_TEMPERATURE = 0.7
+DEFAULT_TOP_P = 1.0
+DEFAULT_RESPONSE_LENGTH = 35
+
+# One scheduler lane for all prewarm calls, so they get one session's fair share
+PREWARM_SESSION = "prewarm"
+
+
+async def prewarm_opener(key: str, endpoint: str, template: Dict[str, str]):
+    """Fill the response pool and TTS cache for one template's opening line"""
+    loop = asyncio.get_running_loop()
+    system = build_system_prompt(template["entity1"], DEFAULT_RESPONSE_LENGTH)
+    history = opener_history(system)
+    cache_key = response_key(system, history, DEFAULT_TEMPERATURE, DEFAULT_TOP_P)
+
+    # Allow a few duplicate replies before giving up on filling the pool
+    for _ in range(response_cache.variants * 2):
+        if response_cache.is_full(cache_key, DEFAULT_TEMPERATURE):
+            return
+        text = await llm_scheduler.call(
+            PREWARM_SESSION,
+            lambda: gpt4o_mini_azure_history_async(
+                system=system,
+                history=history,
+                key=key,
+                endpoint=endpoint,
+                temperature=DEFAULT_TEMPERATURE,
+                top_p=DEFAULT_TOP_P,
+            ),
+            cost=estimate_tokens(system, history),
+        )
+        if not text:
+            continue
+
+        # Synthesize the same sentences a streaming session would speak
+        sentences = split_sentences(text)
+        for sentence in sentences:
+            await tts_scheduler.call(
+                PREWARM_SESSION,
+                lambda sentence=sentence: loop.run_in_executor(
+                    azure_tts.executor,
+                    azure_tts.synthesize_audio,
+                    sentence,
+                    DEFAULT_VOICE,
+                    DEFAULT_SPEED,
+                ),
+            )
+        response_cache.put(cache_key, DEFAULT_TEMPERATURE, " ".join(sentences))
+
+
+async def prewarm_openers(
+    key: str, endpoint: str, templates: Optional[Dict[str, Dict[str, str]]] = None
+):
+    """Prewarm opening text and audio for every sample template"""
+    if templates is None:
+        templates = load_sample_conversations()
+    for name, template in templates.items():
+        try:
+            await prewarm_opener(key, endpoint, template)
+            print(f"Prewarmed opening lines for the '{name}' template")
+        except Exception as e:
+            print(f"Error prewarming the '{name}' template: {e}")
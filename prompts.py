@@ -0,0 +1,61 @@
+import json
+import os
+from typing import Dict, List
+
+SAMPLE_CONVERSATIONS_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "sample_conversations.json"
+)
+
+# Comprehensive human-like conversation instructions added to system prompts
+HUMAN_CONVERSATION_INSTRUCTIONS = """
+
+CONVERSATION STYLE:
+- Engage naturally like a real human in casual conversation
+- React emotionally and personally to what the other person says
+- Use conversational flow: ask questions, make observations, share thoughts
+- Show curiosity, agreement, disagreement, surprise, or other natural reactions
+- Build on previous points rather than just stating new arguments
+- Use "I think...", "That's interesting...", "Wait, but...", "You know what..." etc.
+- Include conversational fillers and natural speech patterns
+- Show personality and individual perspective
+- Sometimes go off on tangents or bring up related points
+- React to the other person's tone and adjust accordingly
+
+AVOID:
+- Formal debate structure or academic presentations  
+- Simply stating facts without personal reaction
+- Ignoring what the other person just said
+- Being overly polite or robotic
+- Starting every response the same way"""
+
+# Added to both speakers' prompts for a round when they start echoing each other
+REPETITION_NUDGE = """
+
+The conversation is going in circles. Do not agree with, praise or restate
+what was just said. Bring in a new angle, a concrete example, a challenge
+or a different question instead."""
+
+
+def build_system_prompt(system: str, response_length: int) -> str:
+    """Full system prompt for an entity: persona, style and length limit"""
+    return (
+        f"{system}"
+        f"{HUMAN_CONVERSATION_INSTRUCTIONS}"
+        f"\n\nKeep your responses to {response_length} words maximum."
+    )
+
+
+def opener_history(system_prompt: str) -> List[Dict[str, str]]:
+    """History that asks entity 1 for the conversation's first line"""
+    return [
+        {
+            "role": "user",
+            "content": f"Make a first response based on your system prompt: {system_prompt}",
+        }
+    ]
+
+
+def load_sample_conversations(path: str = SAMPLE_CONVERSATIONS_PATH) -> Dict[str, Dict[str, str]]:
+    """Sample conversation templates shared with the frontend"""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,56 @@
+import asyncio
+import os
+from typing import Dict
+
+from azure_tts_helper import azure_tts
+from transformers import warm_up_async_client
+
+# Warm-up states; an instance is ready once every client is usable
+PENDING = "pending"
+READY = "ready"
+DEGRADED = "degraded"  # Usable, but pre-connecting failed
+UNAVAILABLE = "unavailable"  # Credentials are missing
+
+
+class Readiness:
+    """Background warm-up of the Azure clients and the readiness it gates
+
+    The app accepts connections as soon as it starts; /ready reports 503
+    until both clients have finished warming up, so a load balancer only
+    routes conversations to warm instances.
+    """
+
+    def __init__(self):
+        self.status: Dict[str, str] = {"tts": PENDING, "llm": PENDING}
+
+    @property
+    def ready(self) -> bool:
+        return all(state in (READY, DEGRADED) for state in self.status.values())
+
+    async def warm_up(self):
+        """Warm up TTS and the LLM client concurrently"""
+        await asyncio.gather(self._warm_up_tts(), self._warm_up_llm())
+
+    async def _warm_up_tts(self):
+        loop = asyncio.get_running_loop()
+        try:
+            connected = await loop.run_in_executor(azure_tts.executor, azure_tts.warm_up)
+        except ValueError as e:
+            print(f"Azure TTS unavailable: {e}")
+            self.status["tts"] = UNAVAILABLE
+            return
+        self.status["tts"] = READY if connected else DEGRADED
+
+    async def _warm_up_llm(self):
+        key = os.getenv("AZURE_OPENAI_KEY_DE_4_1")
+        endpoint = os.getenv("AZURE_OPENAI_ENDPOINT_DE_4_1")
+        if not key or not endpoint:
+            print("Azure OpenAI unavailable: credentials not found")
+            self.status["llm"] = UNAVAILABLE
+            return
+        connected = await warm_up_async_client(key, endpoint)
+        self.status["llm"] = READY if connected else DEGRADED
+
+
+# Create global instance
+readiness = Readiness()
@@ -0,0 +1,113 @@
+import os
+import re
+from collections import Counter, deque
+from typing import FrozenSet, Iterable, Set, Tuple
+
+import metrics
+
+# Watch conversations for the speakers echoing each other
+REPETITION_DETECTION = os.getenv("REPETITION_DETECTION", "1") == "1"
+# A turn is repetitive when this share of its content words or word
+# trigrams already appeared in the recent turns
+REPETITION_THRESHOLD = float(os.getenv("REPETITION_THRESHOLD", "0.6"))
+# Consecutive repetitive turns that mean the conversation has stalled
+REPETITION_TURNS = int(os.getenv("REPETITION_TURNS", "3"))
+# Recent turns each new turn is compared against
+REPETITION_WINDOW = int(os.getenv("REPETITION_WINDOW", "4"))
+
+STOPWORDS_PATH = os.path.join(os.path.dirname(__file__), "stopwords.txt")
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+repetition_actions = metrics.registry.register(
+    metrics.Counter(
+        "babel_repetition_actions_total",
+        "Conversations nudged or ended early for repeating themselves",
+        ("action",),
+    )
+)
+
+
+def load_stopwords(path: str = STOPWORDS_PATH) -> FrozenSet[str]:
+    """Read the bundled stopword list, one word per line"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return frozenset(line.strip().lower() for line in f if line.strip())
+    except OSError as e:
+        print(f"Stopwords unavailable, comparing all words: {e}")
+        return frozenset()
+
+
+STOPWORDS = load_stopwords()
+
+Trigram = Tuple[str, str, str]
+
+
+class RepetitionMonitor:
+    """Incremental check of whether a conversation keeps saying the same thing
+
+    Each turn is compared with the last few turns through running counts of
+    their content words and word trigrams, so observing a turn costs time
+    proportional to its length only.
+    """
+
+    def __init__(
+        self,
+        threshold: float = REPETITION_THRESHOLD,
+        stalled_turns: int = REPETITION_TURNS,
+        window: int = REPETITION_WINDOW,
+    ):
+        self.threshold = threshold
+        self.stalled_turns = stalled_turns
+        self.window = window
+        # Consecutive repetitive turns so far
+        self.streak = 0
+        self._recent: deque = deque()
+        self._words: Counter = Counter()
+        self._trigrams: Counter = Counter()
+
+    @property
+    def stalled(self) -> bool:
+        return self.streak >= self.stalled_turns
+
+    def observe(self, text: str) -> float:
+        """Score a new turn from 0 (all new) to 1 (all repeated) and remember it"""
+        tokens = _WORD.findall(text.lower())
+        words: Set[str] = {
+            token for token in tokens if len(token) > 2 and token not in STOPWORDS
+        }
+        trigrams: Set[Trigram] = set(zip(tokens, tokens[1:], tokens[2:]))
+
+        if not words:
+            # Pure filler ("So true!") adds nothing to the conversation
+            score = 1.0
+        else:
+            seen = sum(1 for word in words if self._words[word])
+            score = seen / len(words)
+        if trigrams:
+            repeated = sum(1 for trigram in trigrams if self._trigrams[trigram])
+            score = max(score, repeated / len(trigrams))
+
+        self.streak = self.streak + 1 if score >= self.threshold else 0
+        self._remember(words, trigrams)
+        return score
+
+    def clear_streak(self):
+        """Give the conversation a fresh chance, e.g. after steering it"""
+        self.streak = 0
+
+    def _remember(self, words: Set[str], trigrams: Set[Trigram]):
+        self._recent.append((words, trigrams))
+        self._words.update(words)
+        self._trigrams.update(trigrams)
+        if len(self._recent) > self.window:
+            old_words, old_trigrams = self._recent.popleft()
+            _forget(self._words, old_words)
+            _forget(self._trigrams, old_trigrams)
+
+
+def _forget(counts: Counter, items: Iterable) -> None:
+    for item in items:
+        counts[item] -= 1
+        if counts[item] <= 0:
+            del counts[item]
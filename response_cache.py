@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+import random
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+# Distinct prompts remembered, and replies kept per prompt at temperature > 0
+RESPONSE_CACHE_ENTRIES = int(os.getenv("RESPONSE_CACHE_ENTRIES", "512"))
+RESPONSE_CACHE_VARIANTS = int(os.getenv("RESPONSE_CACHE_VARIANTS", "3"))
+
+
+def response_key(
+    system: str, history: List[Dict[str, Any]], temperature: float, top_p: float
+) -> str:
+    """Content address of a completion request"""
+    digest = hashlib.sha256()
+    digest.update(system.encode("utf-8"))
+    digest.update(b"\x1f")
+    digest.update(
+        json.dumps(
+            [[m.get("role"), m.get("content")] for m in history], ensure_ascii=False
+        ).encode("utf-8")
+    )
+    digest.update(f"\x1f{float(temperature)!r}\x1f{float(top_p)!r}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """LRU cache of LLM replies keyed by prompt and sampling parameters
+
+    At temperature 0 a reply is deterministic, so one stored reply answers
+    every later identical request. At higher temperatures a pool of distinct
+    replies is collected first and then sampled from, so repeated starts
+    still vary.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = RESPONSE_CACHE_ENTRIES,
+        variants: int = RESPONSE_CACHE_VARIANTS,
+    ):
+        self.max_entries = max_entries
+        self.variants = max(1, variants)
+        self._entries: "OrderedDict[str, List[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _pool_size(self, temperature: float) -> int:
+        return 1 if temperature == 0 else self.variants
+
+    def get(self, key: str, temperature: float) -> Optional[str]:
+        """Return a cached reply, or None while the pool is still filling"""
+        with self._lock:
+            pool = self._entries.get(key)
+            if pool is None or len(pool) < self._pool_size(temperature):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return random.choice(pool)
+
+    def put(self, key: str, temperature: float, text: str):
+        with self._lock:
+            pool = self._entries.get(key)
+            if pool is None:
+                pool = self._entries[key] = []
+            self._entries.move_to_end(key)
+            if text not in pool and len(pool) < self._pool_size(temperature):
+                pool.append(text)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def is_full(self, key: str, temperature: float) -> bool:
+        with self._lock:
+            pool = self._entries.get(key)
+            return pool is not None and len(pool) >= self._pool_size(temperature)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+# Create global instance
+response_cache = ResponseCache()
@@ -0,0 +1,233 @@
+import asyncio
+import os
+import random
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Optional
+
+# Upstream quotas. With several workers, divide these by the worker count
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "300"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "150000"))
+TTS_REQUESTS_PER_MINUTE = int(os.getenv("TTS_REQUESTS_PER_MINUTE", "600"))
+
+# Retries of throttled calls before the error is surfaced
+SCHEDULER_MAX_RETRIES = int(os.getenv("SCHEDULER_MAX_RETRIES", "4"))
+MAX_BACKOFF_SECONDS = 30.0
+
+
+class TokenBucket:
+    """Budget of requests or tokens that refills continuously per minute"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` can be consumed, 0 if it can be now"""
+        self._refill(time.monotonic())
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self._refill(time.monotonic())
+        self.tokens -= min(amount, self.capacity)
+
+
+def is_throttle_error(error: BaseException) -> bool:
+    """True for upstream rate-limit errors (HTTP 429 or TTS throttling)"""
+    if getattr(error, "status_code", None) == 429:
+        return True
+    return getattr(error, "throttled", False) is True
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Retry-After hint carried by a throttling error, if any"""
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is not None:
+        return float(retry_after)
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+class _Waiter:
+    __slots__ = ("cost", "future", "on_queued", "position")
+
+    def __init__(self, cost: float, future: asyncio.Future, on_queued):
+        self.cost = cost
+        self.future = future
+        self.on_queued = on_queued
+        self.position = 0
+
+
+class FairScheduler:
+    """Admits calls to one upstream within its rate limits, fairly across sessions
+
+    Waiting calls are queued per session and admitted round-robin, so one busy
+    conversation cannot starve the others. A throttling response pauses all
+    admissions for its Retry-After (or an exponential backoff) instead of
+    letting every session hammer the upstream.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: float,
+        tokens_per_minute: Optional[float] = None,
+        max_retries: int = SCHEDULER_MAX_RETRIES,
+    ):
+        self.name = name
+        self.max_retries = max_retries
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.paused_until = 0.0
+        self.waiting = 0
+        self.throttled = 0
+        self._queues: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    def _delay(self, cost: float) -> float:
+        delay = max(self.paused_until - time.monotonic(), self.requests.wait_time(1))
+        if self.tokens is not None:
+            delay = max(delay, self.tokens.wait_time(cost))
+        return delay
+
+    def _consume(self, cost: float):
+        self.requests.consume(1)
+        if self.tokens is not None:
+            self.tokens.consume(cost)
+
+    async def acquire(
+        self,
+        session_id: str,
+        cost: float = 1,
+        on_queued: Optional[Callable[[int], Any]] = None,
+        front: bool = False,
+    ):
+        """Wait until a call for this session may be sent upstream"""
+        # Fast path: nobody is waiting and there is budget left
+        if not self._queues and self._delay(cost) <= 0:
+            self._consume(cost)
+            return
+
+        waiter = _Waiter(cost, asyncio.get_running_loop().create_future(), on_queued)
+        queue = self._queues.setdefault(session_id, deque())
+        if front:
+            queue.appendleft(waiter)
+        else:
+            queue.append(waiter)
+        self.waiting += 1
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        self._notify_positions()
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if not waiter.future.done() or waiter.future.cancelled():
+                self._forget(session_id, waiter)
+            raise
+
+    def backoff(self, error: BaseException, attempt: int) -> float:
+        """Pause admissions after a throttling error, returning the delay"""
+        delay = retry_after_seconds(error)
+        if delay is None:
+            delay = min(0.5 * 2**attempt, MAX_BACKOFF_SECONDS)
+            delay *= 0.5 + random.random() / 2
+        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+        self.throttled += 1
+        print(f"{self.name}: throttled upstream, pausing for {delay:.1f}s")
+        return delay
+
+    async def call(
+        self,
+        session_id: str,
+        fn: Callable[[], Awaitable[Any]],
+        cost: float = 1,
+        on_queued: Optional[Callable[[int], Any]] = None,
+    ):
+        """Run fn once admitted, retrying throttled attempts with backoff"""
+        attempt = 0
+        while True:
+            await self.acquire(session_id, cost, on_queued, front=attempt > 0)
+            try:
+                return await fn()
+            except Exception as e:
+                if not is_throttle_error(e) or attempt >= self.max_retries:
+                    raise
+                self.backoff(e, attempt)
+                attempt += 1
+
+    async def _dispatch(self):
+        while self._queues:
+            session_id, queue = next(iter(self._queues.items()))
+            waiter = queue[0]
+            delay = self._delay(waiter.cost)
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            queue.popleft()
+            # Round-robin: the session goes to the back of the line
+            if queue:
+                self._queues.move_to_end(session_id)
+            else:
+                del self._queues[session_id]
+            self.waiting -= 1
+
+            if not waiter.future.done():
+                self._consume(waiter.cost)
+                waiter.future.set_result(None)
+            self._notify_positions()
+
+    def _forget(self, session_id: str, waiter: _Waiter):
+        queue = self._queues.get(session_id)
+        if queue is None or waiter not in queue:
+            return
+        queue.remove(waiter)
+        self.waiting -= 1
+        if not queue:
+            del self._queues[session_id]
+
+    def _notify_positions(self):
+        """Tell waiting callers their place in the round-robin order"""
+        queues = list(self._queues.values())
+        position = 0
+        depth = 0
+        while True:
+            found = False
+            for queue in queues:
+                if depth < len(queue):
+                    found = True
+                    position += 1
+                    waiter = queue[depth]
+                    if waiter.on_queued and waiter.position != position:
+                        waiter.position = position
+                        waiter.on_queued(position)
+            if not found:
+                return
+            depth += 1
+
+
+# Create global instances
+llm_scheduler = FairScheduler(
+    "Azure OpenAI", LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE
+)
+tts_scheduler = FairScheduler("Azure TTS", TTS_REQUESTS_PER_MINUTE)
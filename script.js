@@ -5,6 +5,9 @@ class AIDialogueApp {
         this.currentAudio = null;
         this.conversationActive = false;
         this.audioQueue = [];
+        this.streamTurn = null; // Turn whose sentences are still streaming in
+        this.playbackQueue = []; // Turns pushed ahead by the server (protocol 2)
+        this.exportUrl = null; // Private link to the conversation's audio export
         this.volume = 1.0;
         this.isMuted = false;
 
@@ -46,6 +49,7 @@ class AIDialogueApp {
         // Control elements
         this.startBtn = document.getElementById("startBtn");
         this.stopBtn = document.getElementById("stopBtn");
+        this.downloadBtn = document.getElementById("downloadBtn");
         this.muteBtn = document.getElementById("muteBtn");
         this.volumeSlider = document.getElementById("volumeSlider");
 
@@ -90,6 +94,9 @@ class AIDialogueApp {
         // Control buttons
         this.startBtn.addEventListener("click", () => this.startConversation());
         this.stopBtn.addEventListener("click", () => this.stopConversation());
+        this.downloadBtn.addEventListener("click", () =>
+            this.downloadConversation()
+        );
 
         // Audio controls
         this.muteBtn.addEventListener("click", () => this.toggleMute());
@@ -189,28 +196,18 @@ class AIDialogueApp {
         window.addEventListener("resize", () => this.resizeCanvases());
     }
 
-    initializeSampleConversations() {
-        // Define sample conversation prompts
-        this.sampleConversations = {
-            riddles: {
-                entity1:
-                    "You engage in a back and forth telling riddles. First you will tell a riddle and the opponent will start guessing the answer. Only once they find the correct answer, will you tell them that they are correct and ask them to tell you a riddle. You then start guessing until you get the answer. And so on.",
-                entity2:
-                    "You engage in a back and forth telling riddles. First you will be told a riddle and you will start guessing the answer. Only once you find the correct answer, will the opponent tell you that you are correct and ask you to tell them a riddle next. You then tell a riddle and the opponent starts guessing until they get the answer. And so on.",
-            },
-            political: {
-                entity1:
-                    "You hold conservative political views and believe in traditional values, free markets, and limited government. You engage in respectful political debate while advocating for your conservative perspective.",
-                entity2:
-                    "You hold progressive political views and believe in social justice, environmental protection, and expanded government programs. You engage in respectful political debate while advocating for your liberal perspective.",
-            },
-            jokes: {
-                entity1:
-                    "You are a comedian who loves telling jokes and funny stories. You tell original jokes, puns, and humorous anecdotes, then eagerly wait for feedback and ratings on your comedic material.",
-                entity2:
-                    "You are a comedy critic who rates and reviews jokes. You listen to jokes and provide detailed feedback, ratings out of 10, and constructive criticism about timing, originality, and humor quality.",
-            },
-        };
+    async initializeSampleConversations() {
+        // Sample conversation prompts are shared with the server, which
+        // prewarms their opening lines
+        this.sampleConversations = {};
+        try {
+            const response = await fetch("/sample_conversations.json");
+            if (response.ok) {
+                this.sampleConversations = await response.json();
+            }
+        } catch (error) {
+            console.error("Failed to load sample conversations:", error);
+        }
     }
 
     handleSampleConversationChange() {
@@ -621,6 +618,9 @@ class AIDialogueApp {
             console.log("WebSocket disconnected");
             this.isConnected = false;
             this.conversationActive = false;
+            // The server forgets the session, and its audio, on disconnect
+            this.exportUrl = null;
+            this.downloadBtn.disabled = true;
             this.updateStatus("disconnected", "Disconnected");
             this.resetUI();
         };
@@ -637,12 +637,41 @@ class AIDialogueApp {
         console.log("Received message:", message);
 
         switch (message.type) {
+            case "session":
+                this.exportUrl = message.exportUrl;
+                break;
             case "speaking":
                 this.handleSpeaking(message);
+                this.downloadBtn.disabled = !this.exportUrl;
+                break;
+            case "speaking_start":
+                this.handleSpeakingStart(message);
+                break;
+            case "speaking_chunk":
+                this.handleSpeakingChunk(message);
+                break;
+            case "speaking_end":
+                this.handleSpeakingEnd(message);
+                this.downloadBtn.disabled = !this.exportUrl;
                 break;
             case "finished_speaking":
                 this.handleFinishedSpeaking();
                 break;
+            case "queued":
+                this.handleQueued(message);
+                break;
+            case "ended":
+                // The server stopped generating early; queued turns still play
+                console.info("Conversation ended early:", message.reason);
+                break;
+            case "archived":
+                // Replayable from the archive without regenerating it
+                console.info("Conversation archived:", message.url);
+                break;
+            case "debug":
+                // Per-turn timeline, requested with ?debug in the page URL
+                console.debug("Turn trace:", message.trace);
+                break;
             case "stopped":
                 this.handleStopped();
                 break;
@@ -673,8 +702,213 @@ class AIDialogueApp {
         this.hideLoading();
     }
 
-    playAudio(audioUrl, entity) {
-        const audio = new Audio(audioUrl);
+    handleSpeakingStart(message) {
+        if (message.turn !== undefined) {
+            this.queueTurnStart(message);
+            return;
+        }
+        const { entity } = message;
+
+        // Open an empty message that sentences are appended to as they stream
+        this.addMessage(entity, "", true);
+        this.streamTurn = {
+            entity,
+            queue: [],
+            playing: false,
+            played: false,
+            ended: false,
+        };
+
+        this.hideLoading();
+    }
+
+    handleSpeakingChunk(message) {
+        if (message.turn !== undefined) {
+            this.queueTurnChunk(message);
+            return;
+        }
+        const { entity, audioUrl, text } = message;
+        const turn = this.streamTurn;
+        if (!turn || turn.entity !== entity) return;
+
+        this.appendMessageText(entity, text);
+
+        if (audioUrl && !this.isMuted) {
+            turn.queue.push(audioUrl);
+            this.playNextSegment();
+        }
+    }
+
+    handleSpeakingEnd(message) {
+        if (message.turn !== undefined) {
+            this.queueTurnEnd(message);
+            return;
+        }
+        const turn = this.streamTurn;
+        if (!turn || turn.entity !== message.entity) return;
+
+        turn.ended = true;
+        this.finishStreamTurnIfDone();
+    }
+
+    playNextSegment() {
+        const turn = this.streamTurn;
+        if (!turn || turn.playing) return;
+
+        const audioUrl = turn.queue.shift();
+        if (!audioUrl) {
+            this.finishStreamTurnIfDone();
+            return;
+        }
+
+        turn.playing = true;
+        turn.played = true;
+        this.playAudio(audioUrl, turn.entity, () => {
+            turn.playing = false;
+            this.playNextSegment();
+        });
+    }
+
+    finishStreamTurnIfDone() {
+        const turn = this.streamTurn;
+        if (!turn || !turn.ended || turn.playing || turn.queue.length) return;
+
+        this.streamTurn = null;
+        this.markMessageSpeaking(turn.entity, false);
+
+        if (turn.played) {
+            this.sendAudioFinishedSignal();
+        } else {
+            // If no audio or muted, simulate speaking duration and send finished signal
+            setTimeout(() => {
+                this.sendAudioFinishedSignal();
+            }, 2000);
+        }
+    }
+
+    // Lookahead playback (protocol 2): the server pushes upcoming turns as
+    // soon as they exist. Their audio is prefetched into a local queue, played
+    // back to back, and progress is reported so the server can keep the
+    // queue bounded.
+
+    queueTurnStart(message) {
+        this.playbackQueue.push({
+            turn: message.turn,
+            entity: message.entity,
+            segments: [],
+            next: 0,
+            position: 0,
+            started: false,
+            playing: false,
+            ended: false,
+        });
+        this.hideLoading();
+        this.playQueuedTurn();
+    }
+
+    queueTurnChunk(message) {
+        const turn = this.findQueuedTurn(message.turn);
+        if (!turn) return;
+
+        let audio = null;
+        if (message.audioUrl && !this.isMuted) {
+            // Start downloading and decoding now so it plays without a gap
+            audio = new Audio(message.audioUrl);
+            audio.preload = "auto";
+            audio.load();
+        }
+        turn.segments.push({ audio, text: message.text });
+        this.playQueuedTurn();
+    }
+
+    queueTurnEnd(message) {
+        const turn = this.findQueuedTurn(message.turn);
+        if (!turn) return;
+
+        turn.ended = true;
+        this.playQueuedTurn();
+    }
+
+    findQueuedTurn(index) {
+        return this.playbackQueue.find((turn) => turn.turn === index);
+    }
+
+    playQueuedTurn() {
+        const turn = this.playbackQueue[0];
+        if (!turn || turn.playing) return;
+
+        if (turn.next >= turn.segments.length) {
+            if (turn.ended) this.finishQueuedTurn(turn);
+            return;
+        }
+
+        if (!turn.started) {
+            // Open an empty message that sentences are appended to as they play
+            turn.started = true;
+            this.addMessage(turn.entity, "", true);
+        }
+
+        const segment = turn.segments[turn.next++];
+        this.appendMessageText(turn.entity, segment.text);
+        turn.playing = true;
+
+        const done = (seconds) => {
+            turn.playing = false;
+            turn.position += seconds;
+            this.sendPlaybackPosition(turn, false);
+            this.playQueuedTurn();
+        };
+
+        if (segment.audio) {
+            this.playAudio(segment.audio, turn.entity, () =>
+                done(segment.audio.duration || 0)
+            );
+        } else {
+            // If no audio or muted, simulate speaking duration
+            const seconds = Math.max(1, segment.text.split(/\s+/).length / 2.5);
+            setTimeout(() => done(seconds), seconds * 1000);
+        }
+    }
+
+    finishQueuedTurn(turn) {
+        this.playbackQueue.shift();
+        if (turn.started) {
+            this.markMessageSpeaking(turn.entity, false);
+        }
+        this.sendPlaybackPosition(turn, true);
+        this.playQueuedTurn();
+    }
+
+    sendPlaybackPosition(turn, finished) {
+        if (this.ws && this.ws.readyState === WebSocket.OPEN) {
+            this.ws.send(
+                JSON.stringify({
+                    type: "playback",
+                    turn: turn.turn,
+                    segment: turn.next,
+                    position: turn.position,
+                    finished,
+                })
+            );
+        }
+    }
+
+    clearPlaybackQueue() {
+        // Abort prefetches of turns that will never play
+        for (const turn of this.playbackQueue) {
+            for (const segment of turn.segments) {
+                if (segment.audio) {
+                    segment.audio.removeAttribute("src");
+                    segment.audio.load();
+                }
+            }
+        }
+        this.playbackQueue = [];
+    }
+
+    playAudio(source, entity, onDone = () => this.sendAudioFinishedSignal()) {
+        // Accepts a URL or an already prefetched Audio element
+        const audio = typeof source === "string" ? new Audio(source) : source;
         audio.volume = this.volume;
         this.currentAudio = audio;
 
@@ -697,8 +931,8 @@ class AIDialogueApp {
         audio.onended = () => {
             this.markMessageSpeaking(entity, false);
             this.updateAudioStatus("Audio Ready");
-            this.sendAudioFinishedSignal();
             this.currentAudio = null;
+            onDone();
 
             // Stop waveform animation
             this.stopWaveformAnimation(entity);
@@ -707,8 +941,8 @@ class AIDialogueApp {
         audio.onerror = () => {
             console.error("Error playing audio");
             this.updateAudioStatus("Audio Error");
-            this.sendAudioFinishedSignal();
             this.currentAudio = null;
+            onDone();
 
             // Stop waveform animation
             this.stopWaveformAnimation(entity);
@@ -716,8 +950,8 @@ class AIDialogueApp {
 
         audio.play().catch((error) => {
             console.error("Error playing audio:", error);
-            this.sendAudioFinishedSignal();
             this.stopWaveformAnimation(entity);
+            onDone();
         });
     }
 
@@ -740,6 +974,8 @@ class AIDialogueApp {
             this.currentAudio = null;
         }
         this.audioQueue = [];
+        this.streamTurn = null;
+        this.clearPlaybackQueue();
         this.stopWaveformAnimation(1);
         this.stopWaveformAnimation(2);
 
@@ -749,6 +985,14 @@ class AIDialogueApp {
         this.updateAudioStatus("Conversation stopped");
     }
 
+    handleQueued(message) {
+        // The server is saturated; show where this conversation waits
+        const what = message.upstream === "tts" ? "voice" : "reply";
+        this.updateAudioStatus(
+            `Waiting for ${what} capacity (position ${message.position})...`
+        );
+    }
+
     handleError(message) {
         this.showError(message.message || "An unknown error occurred");
         this.conversationActive = false;
@@ -811,6 +1055,7 @@ class AIDialogueApp {
         // Update UI
         this.startBtn.disabled = true;
         this.stopBtn.disabled = false;
+        this.downloadBtn.disabled = true;
         this.enableControls(false);
         this.updateAudioStatus("Starting conversation...");
 
@@ -824,6 +1069,9 @@ class AIDialogueApp {
         // Send start message with all parameters
         const message = {
             type: "start",
+            stream: true,
+            protocol: 2,
+            debug: new URLSearchParams(window.location.search).has("debug"),
             system1: system1,
             system2: system2,
             voice1: this.voice1Select.value,
@@ -858,6 +1106,8 @@ class AIDialogueApp {
 
         // Clear audio queue
         this.audioQueue = [];
+        this.streamTurn = null;
+        this.clearPlaybackQueue();
 
         // Stop all waveform animations immediately
         this.stopWaveformAnimation(1);
@@ -943,6 +1193,20 @@ class AIDialogueApp {
         this.conversation.scrollTop = this.conversation.scrollHeight;
     }
 
+    appendMessageText(entity, text) {
+        const messages = this.conversation.querySelectorAll(
+            `[data-entity="${entity}"]`
+        );
+        const lastMessage = messages[messages.length - 1];
+        if (!lastMessage) return;
+
+        const textElement = lastMessage.querySelector(".message-text");
+        textElement.textContent = textElement.textContent
+            ? `${textElement.textContent} ${text}`
+            : text;
+        this.conversation.scrollTop = this.conversation.scrollHeight;
+    }
+
     markMessageSpeaking(entity, isSpeaking) {
         const messages = this.conversation.querySelectorAll(
             `[data-entity="${entity}"]`
@@ -958,6 +1222,17 @@ class AIDialogueApp {
         }
     }
 
+    downloadConversation() {
+        // Everything played so far, joined into one MP3 by the server
+        if (!this.exportUrl) return;
+        const link = document.createElement("a");
+        link.href = this.exportUrl;
+        link.download = "conversation.mp3";
+        document.body.appendChild(link);
+        link.click();
+        link.remove();
+    }
+
     clearConversation() {
         this.conversation.innerHTML = "";
     }
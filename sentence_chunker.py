@@ -0,0 +1,59 @@
+import re
+from typing import List, Optional
+
+# Sentence terminators, optionally followed by closing quotes/brackets,
+# that are followed by whitespace (so "3.5" or "U.S.A" mid-token never match)
+_SENTENCE_END = re.compile(r"[.!?…]+[\"'”’)\]]*\s+")
+
+# Common abbreviations that end in a period but do not end a sentence
+_ABBREVIATIONS = frozenset(
+    {"mr.", "mrs.", "ms.", "dr.", "st.", "vs.", "e.g.", "i.e.", "etc.", "jr.", "sr."}
+)
+
+
+class SentenceChunker:
+    """Incrementally cut streamed LLM text into speakable sentences.
+
+    Feed token deltas as they arrive; complete sentences are returned as soon
+    as their terminator is followed by whitespace. Very short sentences are
+    merged with the next one so TTS is not called for fragments like "Oh.".
+    """
+
+    def __init__(self, min_chars: int = 20):
+        self.min_chars = min_chars
+        self.buffer = ""
+
+    def feed(self, delta: str) -> List[str]:
+        """Add a text delta and return any sentences completed by it"""
+        self.buffer += delta
+        sentences: List[str] = []
+        start = 0
+
+        for match in _SENTENCE_END.finditer(self.buffer):
+            candidate = self.buffer[start : match.end()].strip()
+            if len(candidate) < self.min_chars:
+                continue
+            last_word = candidate.rsplit(None, 1)[-1].lower()
+            if last_word in _ABBREVIATIONS:
+                continue
+            sentences.append(candidate)
+            start = match.end()
+
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self) -> Optional[str]:
+        """Return whatever text is left once the stream has ended"""
+        remainder = self.buffer.strip()
+        self.buffer = ""
+        return remainder or None
+
+
+def split_sentences(text: str, min_chars: int = 20) -> List[str]:
+    """Cut a complete text the same way a stream of it would be cut"""
+    chunker = SentenceChunker(min_chars)
+    sentences = chunker.feed(text)
+    tail = chunker.flush()
+    if tail:
+        sentences.append(tail)
+    return sentences
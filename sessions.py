@@ -0,0 +1,340 @@
+import asyncio
+import os
+import secrets
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Coroutine, Dict, List, Optional, Set
+
+from audio_export import EXPORT_MAX_BYTES
+from audio_store import STATE_BACKEND, STATE_DB_PATH, clip_store, connect_state_db
+
+# Capacity limits: open websocket sessions and conversations running at once
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "500"))
+MAX_ACTIVE_CONVERSATIONS = int(os.getenv("MAX_ACTIVE_CONVERSATIONS", "100"))
+
+# Attempts to release a conversation slot while the shared database is locked
+RELEASE_RETRIES = 5
+
+
+class SessionLimitError(Exception):
+    """Raised when the server is at its session or conversation capacity"""
+
+
+class Session:
+    """State of one connected client and its current conversation"""
+
+    __slots__ = (
+        "id",
+        "export_token",
+        "websocket",
+        "task",
+        "stop",
+        "audio_finished",
+        "played",
+        "history",
+        "recording",
+        "recorded_bytes",
+        "clips",
+        "created_at",
+    )
+
+    def __init__(self, session_id: str, websocket: Any = None):
+        self.id = session_id
+        # Sent only to the session's own websocket; the id alone is public
+        # (traces show it), so it must not unlock the conversation's audio
+        self.export_token = secrets.token_urlsafe(24)
+        self.websocket = websocket
+        self.task: Optional[asyncio.Task] = None
+        # Stopped until a conversation is started
+        self.stop = True
+        self.audio_finished = asyncio.Event()
+        # Last turn the client reported fully played (lookahead protocol)
+        self.played = -1
+        # Turns played so far, as {"entity": n, "text": "..."}
+        self.history: List[Dict[str, Any]] = []
+        # Audio of each turn in history (b"" if it had none), kept for export
+        # after its clips expire
+        self.recording: List[bytes] = []
+        self.recorded_bytes = 0
+        # Ids of the clips this session synthesized
+        self.clips: Set[str] = set()
+        self.created_at = time.time()
+
+    def begin(self):
+        """Reset conversation state for a new conversation"""
+        self.stop = False
+        self.audio_finished = asyncio.Event()
+        self.played = -1
+        self.history = []
+        self.recording = []
+        self.recorded_bytes = 0
+        self.clips = set()
+
+    def end(self):
+        """Stop the conversation and release the resources it owns"""
+        self.stop = True
+        # Drop the clips this conversation synthesized
+        clip_store.discard(self.clips)
+        self.clips.clear()
+        # Release any waiting tasks
+        self.audio_finished.set()
+
+    def record(self, audio: bytes):
+        """Keep a played turn's audio for export, up to EXPORT_MAX_BYTES
+
+        Once the cap is reached later turns are recorded without audio, so
+        recording still has one entry per history turn.
+        """
+        if self.recorded_bytes + len(audio) > EXPORT_MAX_BYTES:
+            audio = b""
+        self.recording.append(audio)
+        self.recorded_bytes += len(audio)
+
+    def reset_audio_finished(self):
+        """Clear the audio finished event before sending new audio"""
+        self.audio_finished.clear()
+
+    def report_played(self, turn: int):
+        """Record that the client finished playing a turn"""
+        if turn > self.played:
+            self.played = turn
+        self.audio_finished.set()
+
+    async def wait_for_audio_finished(self, reset: bool = True):
+        """Wait for client to confirm audio playback has finished
+
+        Pass reset=False when the event was already cleared before the audio
+        was sent, so an early acknowledgement is not lost.
+        """
+        if reset:
+            self.audio_finished.clear()
+        await self.audio_finished.wait()
+
+    async def cancel_task(self):
+        """Cancel the running conversation task and wait for it to finish
+
+        The stop flag and a released playback wait end the conversation
+        even if a wait_for swallows the cancellation (an ack arriving in
+        the same tick as the stop), so the task cannot outlive its session.
+        """
+        task = self.task
+        if task is None:
+            return
+        self.stop = True
+        self.audio_finished.set()
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+class SessionRegistry:
+    """O(1) lookup of live sessions with capacity limits"""
+
+    def __init__(
+        self,
+        max_sessions: int = MAX_SESSIONS,
+        max_active: int = MAX_ACTIVE_CONVERSATIONS,
+    ):
+        self.max_sessions = max_sessions
+        self.max_active = max_active
+        self.active = 0
+        self._sessions: Dict[str, Session] = {}
+
+    async def create(self, websocket: Any = None) -> Session:
+        """Register a new session with a unique id"""
+        if len(self._sessions) >= self.max_sessions:
+            raise SessionLimitError("Too many open sessions")
+        session = Session(uuid.uuid4().hex, websocket)
+        self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        return self._sessions.get(session_id)
+
+    def remove(self, session_id: str):
+        self._sessions.pop(session_id, None)
+
+    async def start(self, session: Session, coro: Coroutine) -> asyncio.Task:
+        """Run a conversation for a session if there is capacity for it"""
+        if self.active >= self.max_active:
+            coro.close()
+            raise SessionLimitError(
+                "The server is at capacity. Please try again in a moment."
+            )
+        task = asyncio.create_task(coro)
+        session.task = task
+        self.active += 1
+        task.add_done_callback(lambda _: self._finished(session, task))
+        return task
+
+    def _finished(self, session: Session, task: asyncio.Task):
+        self.active -= 1
+        if session.task is task:
+            session.task = None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class SQLiteSessionRegistry(SessionRegistry):
+    """Session registry whose capacity limits hold across all workers
+
+    Session objects (and their websockets) stay in the worker that owns
+    them; the shared table only records which sessions exist and which are
+    running a conversation, so limits are enforced node-wide. Statements run
+    on a writer thread, so a database locked by another worker never stalls
+    this worker's event loop.
+    """
+
+    def __init__(
+        self,
+        path: str = STATE_DB_PATH,
+        max_sessions: int = MAX_SESSIONS,
+        max_active: int = MAX_ACTIVE_CONVERSATIONS,
+    ):
+        super().__init__(max_sessions, max_active)
+        self.pid = os.getpid()
+        self._writer = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="session-registry"
+        )
+        self._db = connect_state_db(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY,"
+            " pid INTEGER, active INTEGER, created_at REAL)"
+        )
+        self._reap_dead_workers()
+
+    async def create(self, websocket: Any = None) -> Session:
+        """Register a new session with a unique id"""
+        session = Session(uuid.uuid4().hex, websocket)
+        await self._run(self._insert, session)
+        self._sessions[session.id] = session
+        return session
+
+    def remove(self, session_id: str):
+        super().remove(session_id)
+        self._writer.submit(self._delete, session_id)
+
+    async def start(self, session: Session, coro: Coroutine) -> asyncio.Task:
+        """Run a conversation for a session if there is capacity for it"""
+        try:
+            await self._run(self._activate, session.id)
+        except BaseException:
+            coro.close()
+            raise
+        task = asyncio.create_task(coro)
+        session.task = task
+        self.active += 1
+        task.add_done_callback(lambda _: self._finished(session, task))
+        return task
+
+    def _finished(self, session: Session, task: asyncio.Task):
+        super()._finished(session, task)
+        if session.task is None:
+            self._writer.submit(self._release, session.id)
+
+    async def _run(self, fn, *args):
+        """Run a statement on the writer thread; a database that stays locked
+        counts as being at capacity"""
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._writer, fn, *args
+            )
+        except sqlite3.Error as e:
+            print(f"Session registry unavailable: {e}")
+            raise SessionLimitError(
+                "The server is busy. Please try again in a moment."
+            ) from e
+
+    def _insert(self, session: Session):
+        with self._transaction():
+            (count,) = self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()
+            if count >= self.max_sessions:
+                raise SessionLimitError("Too many open sessions")
+            self._db.execute(
+                "INSERT INTO sessions VALUES (?, ?, 0, ?)",
+                (session.id, self.pid, session.created_at),
+            )
+
+    def _activate(self, session_id: str):
+        with self._transaction():
+            (active,) = self._db.execute(
+                "SELECT COUNT(*) FROM sessions WHERE active = 1"
+            ).fetchone()
+            if active >= self.max_active:
+                raise SessionLimitError(
+                    "The server is at capacity. Please try again in a moment."
+                )
+            self._db.execute(
+                "UPDATE sessions SET active = 1 WHERE id = ?", (session_id,)
+            )
+
+    def _release(self, session_id: str):
+        """Free a session's conversation slot, retrying while the database is
+        locked; a slot left marked active would be lost to the whole node"""
+        for attempt in range(RELEASE_RETRIES):
+            try:
+                self._db.execute(
+                    "UPDATE sessions SET active = 0 WHERE id = ?", (session_id,)
+                )
+                return
+            except sqlite3.Error as e:
+                print(f"Could not release conversation slot of {session_id}: {e}")
+                time.sleep(0.5 * 2**attempt)
+
+    def _delete(self, session_id: str):
+        try:
+            self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+        except sqlite3.Error as e:
+            print(f"Could not remove session {session_id}: {e}")
+
+    def _transaction(self):
+        return _ImmediateTransaction(self._db)
+
+    def _reap_dead_workers(self):
+        """Forget sessions of workers that are no longer running"""
+        for (pid,) in self._db.execute("SELECT DISTINCT pid FROM sessions").fetchall():
+            if pid == self.pid:
+                continue
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                self._db.execute("DELETE FROM sessions WHERE pid = ?", (pid,))
+            except PermissionError:
+                pass
+
+
+class _ImmediateTransaction:
+    """Serialize check-then-insert across processes"""
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            try:
+                self.connection.execute("COMMIT")
+                return
+            except sqlite3.Error:
+                # Leave no transaction open for the next statement
+                self.connection.execute("ROLLBACK")
+                raise
+        self.connection.execute("ROLLBACK")
+
+
+def create_session_registry(backend: str = STATE_BACKEND) -> SessionRegistry:
+    """Build the session registry for the configured backend"""
+    if backend == "sqlite":
+        return SQLiteSessionRegistry()
+    return SessionRegistry()
+
+
+# Create global instance
+sessions = create_session_registry()
@@ -0,0 +1,166 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter as Tally
+from typing import Any, Dict, List, Optional, Tuple
+
+import metrics
+
+# Opt-in: sampling another thread's stack is cheap but not free
+LOOP_STALL_DETECTOR = os.getenv("LOOP_STALL_DETECTOR", "0") == "1"
+LOOP_STALL_THRESHOLD_MS = float(os.getenv("LOOP_STALL_THRESHOLD_MS", "100"))
+LOOP_STALL_INTERVAL_MS = float(os.getenv("LOOP_STALL_INTERVAL_MS", "20"))
+
+# Innermost frames that identify where the loop was stuck
+STACK_SIGNATURE_FRAMES = 8
+MAX_OFFENDERS = 200
+
+Signature = Tuple[Tuple[str, int, str], ...]
+
+loop_lag = metrics.registry.register(
+    metrics.Histogram(
+        "babel_event_loop_lag_seconds",
+        "How late the event loop woke up from a short sleep",
+        (),
+        (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+    )
+)
+loop_stalls = metrics.registry.register(
+    metrics.Counter("babel_event_loop_stalls_total", "Event loop stalls over the threshold")
+)
+
+
+class _Offender:
+    """A code path seen blocking the loop, aggregated over its stalls"""
+
+    __slots__ = ("stack", "stalls", "total", "worst", "last_seen")
+
+    def __init__(self, stack: List[str]):
+        self.stack = stack
+        self.stalls = 0
+        self.total = 0.0
+        self.worst = 0.0
+        self.last_seen = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "stalls": self.stalls,
+            "total_ms": round(self.total * 1000, 1),
+            "worst_ms": round(self.worst * 1000, 1),
+            "last_seen": self.last_seen,
+            "stack": self.stack,
+        }
+
+
+class StallDetector:
+    """Watchdog that catches code blocking the event loop
+
+    A heartbeat coroutine ticks every interval and measures how late it
+    wakes. A watchdog thread checks the heartbeat; once it is older than the
+    threshold, the thread samples the loop thread's stack until the loop
+    recovers. Each stall is charged to the stack seen most often while it
+    lasted, and the worst offenders are kept for /debug/stalls.
+    """
+
+    def __init__(
+        self,
+        threshold_ms: float = LOOP_STALL_THRESHOLD_MS,
+        interval_ms: float = LOOP_STALL_INTERVAL_MS,
+    ):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.stalls = 0
+        self._lock = threading.Lock()
+        self._beat = time.perf_counter()
+        self._loop_thread: Optional[int] = None
+        self._stopped = threading.Event()
+        # Stack samples of the stall in progress, by signature
+        self._samples: Optional[Tally] = None
+        self._stacks: Dict[Signature, List[str]] = {}
+        self._offenders: Dict[Signature, _Offender] = {}
+
+    async def run(self):
+        """Heartbeat loop; starts the watchdog thread for its lifetime"""
+        self._loop_thread = threading.get_ident()
+        self._beat = time.perf_counter()
+        self._stopped.clear()
+        watchdog = threading.Thread(
+            target=self._watch, name="loop-stall-watchdog", daemon=True
+        )
+        watchdog.start()
+        try:
+            while True:
+                before = time.perf_counter()
+                await asyncio.sleep(self.interval)
+                now = time.perf_counter()
+                lag = max(0.0, now - before - self.interval)
+                loop_lag.observe(lag)
+                # Take the samples and their stacks together, so a sample
+                # added meanwhile cannot lack its stack
+                with self._lock:
+                    self._beat = now
+                    samples, self._samples = self._samples, None
+                    stacks, self._stacks = self._stacks, {}
+                if samples:
+                    self._record(samples, stacks, lag)
+        finally:
+            self._stopped.set()
+
+    def _watch(self):
+        while not self._stopped.wait(self.interval / 2):
+            if time.perf_counter() - self._beat < self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            del frame
+            signature = tuple(
+                (entry.filename, entry.lineno or 0, entry.name)
+                for entry in stack[-STACK_SIGNATURE_FRAMES:]
+            )
+            with self._lock:
+                if self._samples is None:
+                    self._samples = Tally()
+                self._samples[signature] += 1
+                if signature not in self._stacks:
+                    self._stacks[signature] = [
+                        f"{entry.filename}:{entry.lineno} in {entry.name}"
+                        + (f": {entry.line}" if entry.line else "")
+                        for entry in stack
+                    ]
+
+    def _record(
+        self, samples: Tally, stacks: Dict[Signature, List[str]], duration: float
+    ):
+        """Charge a finished stall to its most sampled stack"""
+        signature, _ = samples.most_common(1)[0]
+        self.stalls += 1
+        loop_stalls.inc()
+        with self._lock:
+            offender = self._offenders.get(signature)
+            if offender is None:
+                offender = self._offenders[signature] = _Offender(stacks[signature])
+            offender.stalls += 1
+            offender.total += duration
+            offender.worst = max(offender.worst, duration)
+            offender.last_seen = time.time()
+            if len(self._offenders) > MAX_OFFENDERS:
+                # Forget the least costly path
+                cheapest = min(self._offenders, key=lambda key: self._offenders[key].total)
+                del self._offenders[cheapest]
+        print(f"Event loop blocked for {duration * 1000:.0f}ms in {offender.stack[-1]}")
+
+    def worst_offenders(self, limit: int = 20) -> List[Dict[str, Any]]:
+        with self._lock:
+            offenders = sorted(
+                self._offenders.values(), key=lambda offender: offender.total, reverse=True
+            )
+        return [offender.to_dict() for offender in offenders[:limit]]
+
+
+# Create global instance
+stall_detector = StallDetector()
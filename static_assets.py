@@ -0,0 +1,167 @@
+import gzip
+import hashlib
+import os
+import re
+from typing import Dict, Iterable, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    # Optional: brotli variants are only built when the package is installed
+    import brotli
+except ImportError:
+    brotli = None
+
+ASSET_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Frontend files served from memory: (URL path, file, media type)
+FRONTEND_ASSETS = [
+    ("/style.css", "style.css", "text/css; charset=utf-8"),
+    ("/script.js", "script.js", "application/javascript; charset=utf-8"),
+    ("/sample_conversations.json", "sample_conversations.json", "application/json"),
+    ("/logo.svg", "static/logo.svg", "image/svg+xml"),
+    ("/logo.png", "static/logo.png", "image/png"),
+    ("/preview.png", "static/preview.png", "image/png"),
+]
+INDEX_ASSET = ("/", "index.html", "text/html; charset=utf-8")
+
+# Types worth compressing; PNGs are already compressed
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+
+class Asset:
+    """A frontend file held in memory with its precompressed variants"""
+
+    def __init__(self, path: str, body: bytes, media_type: str):
+        self.path = path
+        self.media_type = media_type
+        self.digest = hashlib.sha256(body).hexdigest()[:16]
+        # Encoding -> (body, strong ETag); each representation has its own tag
+        self.variants: Dict[str, Tuple[bytes, str]] = {
+            "identity": (body, f'"{self.digest}"')
+        }
+        if media_type.startswith(COMPRESSIBLE_TYPES):
+            compressed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(compressed) < len(body):
+                self.variants["gzip"] = (compressed, f'"{self.digest}-gz"')
+            if brotli is not None:
+                compressed = brotli.compress(body, quality=11)
+                if len(compressed) < len(body):
+                    self.variants["br"] = (compressed, f'"{self.digest}-br"')
+
+    @property
+    def hashed_path(self) -> str:
+        """Content-addressed URL that can be cached forever"""
+        root, ext = os.path.splitext(self.path)
+        return f"/assets{root}.{self.digest[:10]}{ext}"
+
+    def matches(self, if_none_match: str) -> bool:
+        """True if the client already holds any representation of this content"""
+        if if_none_match.strip() == "*":
+            return True
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return any(etag in tags for _, etag in self.variants.values())
+
+
+def choose_encoding(accept_encoding: str, available: Iterable[str]) -> str:
+    """Best precompressed encoding the client accepts"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in ("br", "gzip"):
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if encoding in available and quality > 0:
+            return encoding
+    return "identity"
+
+
+class AssetStore:
+    """Frontend assets loaded once, served compressed with validators"""
+
+    def __init__(self, root: str = ASSET_ROOT):
+        self.root = root
+        self.assets: Dict[str, Asset] = {}
+        self.hashed: Dict[str, Asset] = {}
+
+    def _read(self, filename: str) -> Optional[bytes]:
+        try:
+            with open(os.path.join(self.root, filename), "rb") as f:
+                return f.read()
+        except OSError as e:
+            print(f"Frontend asset unavailable: {e}")
+            return None
+
+    def _add(
+        self, path: str, body: bytes, media_type: str, hashed: bool = True
+    ) -> Asset:
+        asset = Asset(path, body, media_type)
+        self.assets[path] = asset
+        if hashed:
+            self.hashed[asset.hashed_path] = asset
+        return asset
+
+    def load(self):
+        """Read and compress every frontend file, pointing index.html at
+        the content-hashed URLs"""
+        self.assets.clear()
+        self.hashed.clear()
+        for path, filename, media_type in FRONTEND_ASSETS:
+            body = self._read(filename)
+            if body is not None:
+                self._add(path, body, media_type)
+
+        path, filename, media_type = INDEX_ASSET
+        body = self._read(filename)
+        if body is None:
+            return
+        html = body.decode("utf-8")
+        for asset in list(self.assets.values()):
+            name = re.escape(asset.path.lstrip("/"))
+            # href="style.css", src="/logo.svg", href="/logo.png?v=..."
+            html = re.sub(
+                rf'(href|src)="/?{name}(\?[^"]*)?"',
+                rf'\1="{asset.hashed_path}"',
+                html,
+            )
+        # The index is always revalidated, so it gets no immutable URL
+        self._add(path, html.encode("utf-8"), media_type, hashed=False)
+
+    def get(self, path: str) -> Optional[Asset]:
+        return self.assets.get(path)
+
+    def get_hashed(self, path: str) -> Optional[Asset]:
+        return self.hashed.get(path)
+
+    def response(self, asset: Asset, request: Request, immutable: bool = False) -> Response:
+        """Serve an asset, or 304 if the client's copy is current"""
+        encoding = choose_encoding(
+            request.headers.get("accept-encoding", ""), asset.variants
+        )
+        body, etag = asset.variants[encoding]
+        headers = {
+            "ETag": etag,
+            "Cache-Control": IMMUTABLE_CACHE if immutable else REVALIDATE_CACHE,
+            "Vary": "Accept-Encoding",
+        }
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and asset.matches(if_none_match):
+            return Response(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(body, media_type=asset.media_type, headers=headers)
+
+
+# Create global instance
+asset_store = AssetStore()
+asset_store.load()
@@ -0,0 +1,150 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+# Completed turn traces kept for /traces, across all sessions
+TRACE_BUFFER_TURNS = int(os.getenv("TRACE_BUFFER_TURNS", "1000"))
+
+# Anchor perf_counter readings to wall-clock time for export
+_WALL_EPOCH = time.time()
+_PERF_EPOCH = time.perf_counter()
+
+
+def wall_time(perf: float) -> float:
+    """Convert a perf_counter reading to seconds since the Unix epoch"""
+    return _WALL_EPOCH + (perf - _PERF_EPOCH)
+
+
+class Span:
+    """One timed step of a turn"""
+
+    __slots__ = ("name", "start", "end", "attrs")
+
+    def __init__(self, name: str, start: float, end: Optional[float] = None, **attrs: Any):
+        self.name = name
+        self.start = start
+        self.end = end
+        self.attrs = attrs
+
+    def finish(self, **attrs: Any):
+        self.end = time.perf_counter()
+        self.attrs.update(attrs)
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        end = self.end if self.end is not None else self.start
+        return {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round((end - self.start) * 1000, 3),
+            **self.attrs,
+        }
+
+
+class TurnTrace:
+    """Timeline of one turn: queueing, LLM, TTS, sending and client playback"""
+
+    def __init__(self, session_id: str, index: int, entity: int):
+        self.session_id = session_id
+        self.index = index
+        self.entity = entity
+        self.started = time.perf_counter()
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def begin(self, name: str, **attrs: Any) -> Span:
+        """Open a span now; call finish() on it when the step ends"""
+        span = Span(name, time.perf_counter(), **attrs)
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def add(self, name: str, start: float, end: Optional[float] = None, **attrs: Any):
+        """Record a span whose times are already known"""
+        span = Span(name, start, end if end is not None else time.perf_counter(), **attrs)
+        with self._lock:
+            self.spans.append(span)
+
+    def instant(self, name: str, **attrs: Any):
+        now = time.perf_counter()
+        self.add(name, now, now, **attrs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "session": self.session_id,
+            "turn": self.index,
+            "entity": self.entity,
+            "started_at": wall_time(self.started),
+            "spans": [span.to_dict(self.started) for span in spans],
+        }
+
+    def chrome_events(self, pid: int) -> List[Dict[str, Any]]:
+        """Complete ("X") events in the Chrome trace event format"""
+        with self._lock:
+            spans = list(self.spans)
+        events = []
+        for span in spans:
+            end = span.end if span.end is not None else span.start
+            # Overlapping TTS segments get their own rows
+            tid = 100 + span.attrs.get("segment", 0) if span.name == "tts" else 1
+            events.append(
+                {
+                    "name": span.name,
+                    "cat": f"turn {self.index}",
+                    "ph": "X",
+                    "ts": wall_time(span.start) * 1e6,
+                    "dur": (end - span.start) * 1e6,
+                    "pid": pid,
+                    "tid": tid,
+                    "args": {"turn": self.index, "entity": self.entity, **span.attrs},
+                }
+            )
+        return events
+
+
+class TraceBuffer:
+    """Ring buffer of completed turn traces"""
+
+    def __init__(self, max_turns: int = TRACE_BUFFER_TURNS):
+        self._traces: deque = deque(maxlen=max_turns)
+        self._lock = threading.Lock()
+
+    def add(self, trace: TurnTrace):
+        with self._lock:
+            self._traces.append(trace)
+
+    def traces(self, session_id: Optional[str] = None) -> List[TurnTrace]:
+        with self._lock:
+            traces = list(self._traces)
+        if session_id is not None:
+            traces = [trace for trace in traces if trace.session_id == session_id]
+        return traces
+
+    def to_json(self, session_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        return [trace.to_dict() for trace in self.traces(session_id)]
+
+    def to_chrome(self, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """Traces for chrome://tracing or Perfetto, one process per session"""
+        events: List[Dict[str, Any]] = []
+        pids: Dict[str, int] = {}
+        for trace in self.traces(session_id):
+            pid = pids.get(trace.session_id)
+            if pid is None:
+                pid = pids[trace.session_id] = len(pids) + 1
+                events.append(
+                    {
+                        "name": "process_name",
+                        "ph": "M",
+                        "pid": pid,
+                        "args": {"name": f"session {trace.session_id}"},
+                    }
+                )
+            events.extend(trace.chrome_events(pid))
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+# Create global instance
+trace_buffer = TraceBuffer()
@@ -0,0 +1,98 @@
+import os
+from bisect import bisect_left
+from typing import Awaitable, Callable, Dict, List, Optional
+
+# Prompt tokens of history sent with each call; older turns fall out of the window
+TRANSCRIPT_TOKEN_BUDGET = int(os.getenv("TRANSCRIPT_TOKEN_BUDGET", "1500"))
+
+# Fold turns that left the window into a running summary (costs extra LLM calls)
+TRANSCRIPT_SUMMARIZE = os.getenv("TRANSCRIPT_SUMMARIZE", "0") not in ("", "0", "false")
+
+# Per-message overhead of the chat format, in tokens
+MESSAGE_OVERHEAD_TOKENS = 4
+
+Summarizer = Callable[[Optional[str], List[str]], Awaitable[Optional[str]]]
+
+
+def estimate_text_tokens(text: str) -> int:
+    """Rough token count of a message: characters / 4 plus format overhead"""
+    return len(text) // 4 + MESSAGE_OVERHEAD_TOKENS
+
+
+class _Entry:
+    """One spoken turn with its message dicts for both points of view"""
+
+    __slots__ = ("entity", "text", "as_user", "as_assistant")
+
+    def __init__(self, entity: int, text: str):
+        self.entity = entity
+        self.text = text
+        # Built once and shared by every later prompt; never mutated
+        self.as_user = {"role": "user", "content": text}
+        self.as_assistant = {"role": "assistant", "content": text}
+
+
+class Transcript:
+    """Append-only record of a conversation shared by both entities
+
+    Each entity sees its own turns as "assistant" and the other's as "user".
+    Prompts only carry the most recent turns that fit the token budget, so
+    their size stays constant however long the conversation runs. Turns that
+    leave the window can be folded into a running summary.
+    """
+
+    def __init__(self, token_budget: int = TRANSCRIPT_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self.entries: List[_Entry] = []
+        # Prefix sums of entry tokens: _totals[i] covers entries[:i]
+        self._totals: List[int] = [0]
+        self.summary: Optional[str] = None
+        self.summarized = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def append(self, entity: int, text: str):
+        self.entries.append(_Entry(entity, text))
+        self._totals.append(self._totals[-1] + estimate_text_tokens(text))
+
+    def window_start(self) -> int:
+        """Index of the oldest entry that still fits the token budget"""
+        if not self.entries:
+            return 0
+        # Smallest i with totals[-1] - totals[i] <= budget, keeping the last turn
+        floor = self._totals[-1] - self.token_budget
+        start = bisect_left(self._totals, floor)
+        return min(start, len(self.entries) - 1)
+
+    def messages_for(self, entity: int) -> List[Dict[str, str]]:
+        """Chat history from one entity's point of view, within the budget"""
+        start = self.window_start()
+        messages: List[Dict[str, str]] = []
+        if self.summary and self.summarized > 0:
+            messages.append(
+                {
+                    "role": "system",
+                    "content": f"Summary of the conversation so far: {self.summary}",
+                }
+            )
+        for entry in self.entries[start:]:
+            messages.append(entry.as_assistant if entry.entity == entity else entry.as_user)
+        return messages
+
+    def needs_summary(self) -> bool:
+        return self.summarized < self.window_start()
+
+    async def summarize(self, summarizer: Summarizer):
+        """Fold the turns that left the window into the running summary"""
+        end = self.window_start()
+        if end <= self.summarized:
+            return
+        dropped = [
+            f"Speaker {entry.entity}: {entry.text}"
+            for entry in self.entries[self.summarized : end]
+        ]
+        summary = await summarizer(self.summary, dropped)
+        if summary:
+            self.summary = summary
+            self.summarized = end
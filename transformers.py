@@ -1,48 +1,252 @@
-from openai import AzureOpenAI
-from dotenv import load_dotenv
-import os
-from typing import List, Dict, Any
-
-load_dotenv()
-
-
-def gpt4o_mini_azure_history(
-    system: str,
-    history: List[Dict[str, Any]],
-    key: str,
-    endpoint: str,
-    temperature: float = 0.7,
-    top_p: float = 1.0,
-):
-    """Synchronous Azure OpenAI call with history support."""
-    client = AzureOpenAI(
-        api_key=key,
-        api_version="2024-02-01",
-        azure_endpoint=endpoint,
-    )
-
-    # dynamically create the messages list
-    messages: List[Dict[str, str]] = [{"role": "system", "content": system}]
-    # Add history messages ensuring correct role and content keys
-    for message in history:
-        # Basic validation, assuming history has 'role' and 'content'
-        if isinstance(message, dict) and "role" in message and "content" in message:
-            messages.append({"role": message["role"], "content": message["content"]})
-        else:
-            # Handle potential malformed history entries if necessary
-            print(f"Skipping malformed history message: {message}")
-            pass
-
-    # Create a chat completion request
-    response = client.chat.completions.create(
-        messages=messages,  # type: ignore
-        model="gpt-4o-mini",
-        temperature=temperature,
-        top_p=top_p,
-        max_tokens=250,  # Increased for longer responses
-    )
-
-    # Access the content and usage information using dot notation
-    content = response.choices[0].message.content
-
-    return content
+from openai import AzureOpenAI, AsyncAzureOpenAI, APIStatusError, APITimeoutError
+from dotenv import load_dotenv
+import asyncio
+import httpx
+import os
+import threading
+import time
+import metrics
+from typing import List, Dict, Any, Tuple, AsyncIterator
+
+load_dotenv()
+
+API_VERSION = "2024-02-01"
+
+# OPTIMIZATION: One long-lived async client per (endpoint, key) with a pooled
+# HTTP connection set, shared by every conversation in the process
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+MAX_COMPLETION_TOKENS = 250
+
+_async_clients: Dict[Tuple[str, str], AsyncAzureOpenAI] = {}
+# Clients may be created on an executor thread, see warm_up_async_client
+_async_clients_lock = threading.Lock()
+
+
+def _build_messages(system: str, history: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """Build the chat messages list from a system prompt and history"""
+    # dynamically create the messages list
+    messages: List[Dict[str, str]] = [{"role": "system", "content": system}]
+    # Add history messages ensuring correct role and content keys. The dicts
+    # are shared, not copied: transcript messages are never mutated
+    for message in history:
+        # Basic validation, assuming history has 'role' and 'content'
+        if isinstance(message, dict) and "role" in message and "content" in message:
+            messages.append(message)
+        else:
+            # Handle potential malformed history entries if necessary
+            print(f"Skipping malformed history message: {message}")
+            pass
+    return messages
+
+
+def estimate_tokens(system: str, history: List[Dict[str, Any]]) -> int:
+    """Rough token cost of a call: prompt characters / 4 plus the completion cap"""
+    chars = len(system) + sum(len(str(m.get("content", ""))) for m in history)
+    return chars // 4 + MAX_COMPLETION_TOKENS
+
+
+def _record_failure(error: Exception):
+    """Count a failed Azure OpenAI call as a timeout or an error"""
+    if isinstance(error, APITimeoutError):
+        metrics.timeouts.inc(stage="llm")
+    else:
+        metrics.errors.inc(stage="llm")
+
+
+def _record_usage(usage):
+    """Record token usage reported with a completion"""
+    if usage is not None:
+        metrics.llm_tokens.observe(usage.prompt_tokens, kind="prompt")
+        metrics.llm_tokens.observe(usage.completion_tokens, kind="completion")
+
+
+def get_async_client(key: str, endpoint: str) -> AsyncAzureOpenAI:
+    """Return the shared async Azure OpenAI client for these credentials"""
+    client = _async_clients.get((endpoint, key))
+    if client is not None:
+        return client
+    with _async_clients_lock:
+        client = _async_clients.get((endpoint, key))
+        if client is not None:
+            return client
+        # Building the SSL context blocks for hundreds of milliseconds
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE,
+            ),
+            timeout=httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=5.0),
+        )
+        client = AsyncAzureOpenAI(
+            api_key=key,
+            api_version=API_VERSION,
+            azure_endpoint=endpoint,
+            http_client=http_client,
+            # Throttling is retried by the fair scheduler, which honors Retry-After
+            max_retries=0,
+        )
+        _async_clients[(endpoint, key)] = client
+    return client
+
+
+def _prepare_async_client(key: str, endpoint: str) -> AsyncAzureOpenAI:
+    """Build the shared client and import the API resources it loads lazily"""
+    client = get_async_client(key, endpoint)
+    client.models
+    client.chat.completions
+    return client
+
+
+async def warm_up_async_client(key: str, endpoint: str) -> bool:
+    """Create the shared client and open a pooled connection to the endpoint
+
+    Listing models costs no tokens. Any HTTP answer means the connection
+    (and its TLS session) is open and kept alive for the first completion.
+    The client is built in an executor, so neither its SSL setup nor the
+    resource imports of its first request stall the loop.
+    """
+    client = await asyncio.get_running_loop().run_in_executor(
+        None, _prepare_async_client, key, endpoint
+    )
+    try:
+        await client.models.list()
+    except APIStatusError:
+        pass
+    except Exception as e:
+        print(f"Warning: Could not pre-connect to Azure OpenAI: {e}")
+        return False
+    return True
+
+
+async def close_async_clients():
+    """Close all shared async clients and their connection pools"""
+    clients = list(_async_clients.values())
+    _async_clients.clear()
+    for client in clients:
+        try:
+            await client.close()
+        except Exception as e:
+            print(f"Error closing Azure OpenAI client: {e}")
+
+
+def gpt4o_mini_azure_history(
+    system: str,
+    history: List[Dict[str, Any]],
+    key: str,
+    endpoint: str,
+    temperature: float = 0.7,
+    top_p: float = 1.0,
+):
+    """Synchronous Azure OpenAI call with history support."""
+    client = AzureOpenAI(
+        api_key=key,
+        api_version=API_VERSION,
+        azure_endpoint=endpoint,
+    )
+
+    messages = _build_messages(system, history)
+
+    # Create a chat completion request
+    response = client.chat.completions.create(
+        messages=messages,  # type: ignore
+        model="gpt-4o-mini",
+        temperature=temperature,
+        top_p=top_p,
+        max_tokens=MAX_COMPLETION_TOKENS,  # Increased for longer responses
+    )
+
+    # Access the content and usage information using dot notation
+    content = response.choices[0].message.content
+
+    return content
+
+
+async def gpt4o_mini_azure_history_async(
+    system: str,
+    history: List[Dict[str, Any]],
+    key: str,
+    endpoint: str,
+    temperature: float = 0.7,
+    top_p: float = 1.0,
+):
+    """Non-blocking Azure OpenAI call with history support.
+
+    Uses the shared pooled client, so the event loop keeps serving other
+    conversations while the completion is in flight.
+    """
+    client = get_async_client(key, endpoint)
+
+    messages = _build_messages(system, history)
+
+    started = time.perf_counter()
+    try:
+        response = await client.chat.completions.create(
+            messages=messages,  # type: ignore
+            model="gpt-4o-mini",
+            temperature=temperature,
+            top_p=top_p,
+            max_tokens=MAX_COMPLETION_TOKENS,
+        )
+    except Exception as e:
+        _record_failure(e)
+        raise
+    metrics.llm_latency.observe(
+        time.perf_counter() - started, mode="complete", phase="complete"
+    )
+    _record_usage(response.usage)
+
+    return response.choices[0].message.content
+
+
+async def gpt4o_mini_azure_history_stream(
+    system: str,
+    history: List[Dict[str, Any]],
+    key: str,
+    endpoint: str,
+    temperature: float = 0.7,
+    top_p: float = 1.0,
+) -> AsyncIterator[str]:
+    """Stream an Azure OpenAI completion, yielding text deltas as they arrive."""
+    client = get_async_client(key, endpoint)
+
+    messages = _build_messages(system, history)
+
+    started = time.perf_counter()
+    first_token = None
+    # Each content chunk carries one token unless the service reports usage
+    chunks = 0
+    usage = None
+    try:
+        stream = await client.chat.completions.create(
+            messages=messages,  # type: ignore
+            model="gpt-4o-mini",
+            temperature=temperature,
+            top_p=top_p,
+            max_tokens=MAX_COMPLETION_TOKENS,
+            stream=True,
+        )
+
+        async for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                if first_token is None:
+                    first_token = time.perf_counter()
+                    metrics.llm_latency.observe(
+                        first_token - started, mode="stream", phase="first_token"
+                    )
+                chunks += 1
+                yield chunk.choices[0].delta.content
+    except Exception as e:
+        _record_failure(e)
+        raise
+
+    metrics.llm_latency.observe(
+        time.perf_counter() - started, mode="stream", phase="complete"
+    )
+    if usage is not None:
+        _record_usage(usage)
+    else:
+        metrics.llm_tokens.observe(chunks, kind="completion")
@@ -0,0 +1,176 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+# Memory tier is always on; the disk tier is enabled by setting TTS_CACHE_DIR
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MB", "32")) * 1024 * 1024
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR") or None
+TTS_CACHE_DISK_MAX_BYTES = int(os.getenv("TTS_CACHE_DISK_MB", "512")) * 1024 * 1024
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so trivially different spellings share an entry"""
+    return " ".join(text.split())
+
+
+def cache_key(voice_name: str, rate_percent: int, output_format: str, text: str) -> str:
+    """Content address of a synthesis request"""
+    material = "\x1f".join(
+        [voice_name, str(rate_percent), output_format, normalize_text(text)]
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """Content-addressed cache of synthesized audio with LRU eviction
+
+    Entries live in a size-bounded memory tier and, optionally, a larger
+    size-bounded disk tier. Disk hits are promoted back into memory.
+    """
+
+    def __init__(
+        self,
+        max_memory_bytes: int = TTS_CACHE_MAX_BYTES,
+        disk_dir: Optional[str] = TTS_CACHE_DIR,
+        max_disk_bytes: int = TTS_CACHE_DISK_MAX_BYTES,
+    ):
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+
+        self.memory_bytes = 0
+        self.disk_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._load_disk_index()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return cached audio for a key, or None on a miss"""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return data
+            on_disk = key in self._disk
+            if on_disk:
+                self._disk.move_to_end(key)
+
+        if on_disk:
+            try:
+                with open(self._disk_path(key), "rb") as f:
+                    data = f.read()
+            except OSError:
+                with self._lock:
+                    size = self._disk.pop(key, None)
+                    if size is not None:
+                        self.disk_bytes -= size
+                data = None
+
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._store_memory(key, data)
+        return data
+
+    def put(self, key: str, data: bytes):
+        """Cache audio under a key in every enabled tier"""
+        if not data:
+            return
+        with self._lock:
+            self._store_memory(key, data)
+            write_disk = self.disk_dir is not None and key not in self._disk
+
+        if write_disk:
+            path = self._disk_path(key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Write to a temp file first so readers never see partial audio
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"TTS cache: could not write {path}: {e}")
+                return
+            with self._lock:
+                if key not in self._disk:
+                    self._disk[key] = len(data)
+                    self.disk_bytes += len(data)
+                evicted = self._evict_disk()
+            for old_key in evicted:
+                try:
+                    os.remove(self._disk_path(old_key))
+                except OSError:
+                    pass
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and tier sizes"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self.memory_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self.disk_bytes,
+            }
+
+    def _store_memory(self, key: str, data: bytes):
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self.memory_bytes -= len(old)
+        if len(data) > self.max_memory_bytes:
+            return
+        self._memory[key] = data
+        self.memory_bytes += len(data)
+        while self.memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self.memory_bytes -= len(evicted)
+
+    def _evict_disk(self):
+        evicted = []
+        while self.disk_bytes > self.max_disk_bytes and self._disk:
+            old_key, size = self._disk.popitem(last=False)
+            self.disk_bytes -= size
+            evicted.append(old_key)
+        return evicted
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.mp3")
+
+    def _load_disk_index(self):
+        """Rebuild the disk LRU order from file modification times"""
+        entries = []
+        for root, _, files in os.walk(self.disk_dir):
+            for filename in files:
+                if not filename.endswith(".mp3"):
+                    continue
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, filename[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self.disk_bytes += size
+        for old_key in self._evict_disk():
+            try:
+                os.remove(self._disk_path(old_key))
+            except OSError:
+                pass